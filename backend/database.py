@@ -1,7 +1,8 @@
 from __future__ import annotations
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
+from bson import ObjectId
 from pymongo import MongoClient
 from pymongo.collection import Collection
 from dotenv import load_dotenv
@@ -10,6 +11,24 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "armancoffee")
+DEFAULT_OUTLET_ID = os.getenv("DEFAULT_OUTLET_ID", "main")
+
+# Per-outlet collections; indexes lead with outlet_id so {outlet_id, _id}
+# can become the shard key without reindexing.
+OUTLET_INDEXES = {
+    "menu_category": [[("outlet_id", 1), ("is_active", 1)]],
+    "menu_item": [[("outlet_id", 1), ("is_active", 1)]],
+    "order": [[("outlet_id", 1), ("_id", 1)], [("outlet_id", 1), ("status", 1), ("_id", 1)]],
+    "booking": [[("outlet_id", 1), ("_id", 1)], [("outlet_id", 1), ("date", 1), ("_id", 1)]],
+    "table": [[("outlet_id", 1), ("_id", 1)], [("outlet_id", 1), ("table_number", 1)]],
+}
+
+# Natural keys /menu/ingest upserts on; unique so concurrent or retried
+# ingests can't insert a second copy
+UNIQUE_INDEXES = {
+    "menu_category": [("outlet_id", 1), ("slug", 1)],
+    "menu_item": [("outlet_id", 1), ("category_slug", 1), ("name", 1)],
+}
 
 _client: Optional[MongoClient] = None
 _db = None
@@ -27,6 +46,27 @@ def collection(name: str) -> Collection:
     return get_db()[name]
 
 
+def ensure_indexes() -> None:
+    for name, indexes in OUTLET_INDEXES.items():
+        for keys in indexes:
+            collection(name).create_index(keys)
+    for name, keys in UNIQUE_INDEXES.items():
+        col = collection(name)
+        # Replace the plain index on the same keys from an earlier release
+        for index_name, info in col.index_information().items():
+            if info["key"] == keys and not info.get("unique"):
+                col.drop_index(index_name)
+        col.create_index(keys, unique=True)
+
+
+def backfill_outlet_id(outlet_id: str = DEFAULT_OUTLET_ID) -> Dict[str, int]:
+    """Assign documents written before outlets existed to ``outlet_id``."""
+    return {
+        name: collection(name).update_many({"outlet_id": {"$exists": False}}, {"$set": {"outlet_id": outlet_id}}).modified_count
+        for name in OUTLET_INDEXES
+    }
+
+
 def create_document(collection_name: str, data: Dict[str, Any]) -> str:
     col = collection(collection_name)
     now = datetime.utcnow()
@@ -39,11 +79,35 @@ def create_document(collection_name: str, data: Dict[str, Any]) -> str:
     return str(res.inserted_id)
 
 
-def get_documents(collection_name: str, filter_dict: Optional[Dict[str, Any]] = None, limit: int = 100) -> List[Dict[str, Any]]:
+def get_documents(
+    collection_name: str,
+    filter_dict: Optional[Dict[str, Any]] = None,
+    limit: int = 100,
+    projection: Optional[Dict[str, int]] = None,
+    sort: Optional[List[Tuple[str, int]]] = None,
+    skip: int = 0,
+    after: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Fetch documents, optionally projected, sorted and paginated.
+
+    ``after`` is an ``_id`` cursor: only documents with a greater ``_id`` are
+    returned, in ``_id`` order unless ``sort`` says otherwise. Pages are only
+    gap-free if the first page was also fetched with ``sort=[("_id", 1)]``.
+    """
     col = collection(collection_name)
-    cursor = col.find(filter_dict or {}).limit(limit)
+    query = dict(filter_dict or {})
+    if after:
+        query["_id"] = {"$gt": ObjectId(after)}
+        sort = sort or [("_id", 1)]
+    cursor = col.find(query, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    if skip:
+        cursor = cursor.skip(skip)
+    cursor = cursor.limit(limit)
     items: List[Dict[str, Any]] = []
     for doc in cursor:
-        doc["_id"] = str(doc["_id"])  # stringify ObjectId
+        if "_id" in doc:
+            doc["_id"] = str(doc["_id"])  # stringify ObjectId
         items.append(doc)
     return items
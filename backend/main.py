@@ -1,11 +1,15 @@
 from __future__ import annotations
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Dict, Any, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
 
-from database import create_document, get_documents, collection
-from schemas import User, MenuCategory, MenuItem, Order, Booking, Table
+from database import create_document, get_documents, collection, ensure_indexes, backfill_outlet_id, DEFAULT_OUTLET_ID
+from watchdog import watchdog
+from schemas import User, MenuCategory, MenuItem, MenuCategoryPatch, MenuItemPatch, Order, Booking, Table
 
 app = FastAPI(title="Arman Speciality Coffee API")
 
@@ -18,6 +22,31 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def startup():
+    ensure_indexes()
+    # Every query filters on outlet_id, so pre-outlet documents must be
+    # claimed before serving; a no-op once they have been
+    backfill_outlet_id()
+    watchdog.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    watchdog.stop()
+
+
+@app.get("/admin/metrics")
+async def metrics():
+    return {"watchdog": watchdog.stats()}
+
+
+def _with_outlet(model: BaseModel, outlet_id: Optional[str] = None) -> Dict[str, Any]:
+    doc = model.model_dump()
+    doc["outlet_id"] = outlet_id or doc.get("outlet_id") or DEFAULT_OUTLET_ID
+    return doc
+
+
 @app.get("/test")
 async def test():
     # verify db connection by listing collections
@@ -30,6 +59,59 @@ async def _list_collections() -> List[str]:
     return db.list_collection_names()
 
 
+# Listing helpers: ?fields=a,b&sort=-created_at, checked against an allow-list
+def _allowed_fields(model: type) -> Set[str]:
+    return set(model.model_fields) | {"_id", "created_at", "updated_at"}
+
+
+def _parse_fields(fields: Optional[str], allowed: Set[str]) -> Optional[Dict[str, int]]:
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    projection = {f: 1 for f in names}
+    if "_id" not in projection:
+        projection["_id"] = 1  # keep ids so clients can page with ?after=
+    return projection
+
+
+def _parse_sort(sort: Optional[str], allowed: Set[str]) -> Optional[List[Tuple[str, int]]]:
+    if not sort:
+        return None
+    spec: List[Tuple[str, int]] = []
+    for part in sort.split(","):
+        part = part.strip()
+        name, direction = (part[1:], -1) if part.startswith("-") else (part, 1)
+        if name not in allowed:
+            raise HTTPException(status_code=400, detail=f"Unknown sort field: {name}")
+        spec.append((name, direction))
+    return spec
+
+
+def _list_args(fields: Optional[str], sort: Optional[str], after: Optional[str], allowed: Set[str]) -> Dict[str, Any]:
+    # ?after= pages in _id order, so it can't be combined with a custom sort
+    if after and sort:
+        raise HTTPException(status_code=400, detail="after cannot be combined with sort")
+    if after and not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Without an explicit sort every page, including the first, is read in
+    # _id order; otherwise the first page's last _id isn't a valid cursor.
+    return {
+        "projection": _parse_fields(fields, allowed),
+        "sort": _parse_sort(sort, allowed) or [("_id", 1)],
+        "after": after,
+    }
+
+
+def _next_cursor(docs: List[Dict[str, Any]], limit: int, sort: Optional[str]) -> Optional[str]:
+    # Cursors are only meaningful in the default _id order
+    if sort or len(docs) < limit:
+        return None
+    return docs[-1].get("_id")
+
+
 # Auth: phone-first register/login (simple)
 class PhonePayload(BaseModel):
     phone: str
@@ -55,68 +137,164 @@ class MenuIngest(BaseModel):
     items: List[MenuItem]
 
 
+def _menu_version(outlet_id: str) -> int:
+    doc = collection("meta").find_one({"_id": f"menu:{outlet_id}"})
+    return doc.get("version", 0) if doc else 0
+
+
+def _bump_menu_version(outlet_id: str) -> int:
+    doc = collection("meta").find_one_and_update(
+        {"_id": f"menu:{outlet_id}"}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return doc["version"]
+
+
+def _menu_diff_ops(existing: Dict[Any, Dict[str, Any]], desired: Dict[Any, Dict[str, Any]], key_fields: List[str]) -> List[UpdateOne]:
+    # Upsert only what changed; anything missing from the payload is deactivated
+    now = datetime.utcnow()
+    ops: List[UpdateOne] = []
+    for key, doc in desired.items():
+        cur = existing.get(key)
+        if cur is not None and all(cur.get(f) == v for f, v in doc.items()):
+            continue
+        ops.append(UpdateOne(
+            {f: doc[f] for f in key_fields},
+            {"$set": {**doc, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+            upsert=True,
+        ))
+    for key, cur in existing.items():
+        if key not in desired and cur.get("is_active", True):
+            ops.append(UpdateOne({"_id": cur["_id"]}, {"$set": {"is_active": False, "updated_at": now}}))
+    return ops
+
+
 @app.post("/menu/ingest")
-async def ingest_menu(data: MenuIngest):
-    # clear and insert
-    db = collection("menu_item").database
-    db["menu_category"].delete_many({})
-    db["menu_item"].delete_many({})
-    for c in data.categories:
-        create_document("menu_category", c.model_dump())
-    for i in data.items:
-        create_document("menu_item", i.model_dump())
-    return {"ok": True}
+async def ingest_menu(data: MenuIngest, outlet_id: str = DEFAULT_OUTLET_ID):
+    # diff against the outlet's stored menu, keyed by slug (categories) and category_slug+name (items)
+    existing_cats = {c["slug"]: c for c in collection("menu_category").find({"outlet_id": outlet_id})}
+    existing_items = {(i["category_slug"], i["name"]): i for i in collection("menu_item").find({"outlet_id": outlet_id})}
+    desired_cats = {c.slug: _with_outlet(c, outlet_id) for c in data.categories}
+    desired_items = {(i.category_slug, i.name): _with_outlet(i, outlet_id) for i in data.items}
+    cat_ops = _menu_diff_ops(existing_cats, desired_cats, ["outlet_id", "slug"])
+    item_ops = _menu_diff_ops(existing_items, desired_items, ["outlet_id", "category_slug", "name"])
+    if not cat_ops and not item_ops:
+        return {"ok": True, "version": _menu_version(outlet_id), "categories_changed": 0, "items_changed": 0}
+    if cat_ops:
+        collection("menu_category").bulk_write(cat_ops, ordered=False)
+    if item_ops:
+        collection("menu_item").bulk_write(item_ops, ordered=False)
+    version = _bump_menu_version(outlet_id)
+    return {"ok": True, "version": version, "categories_changed": len(cat_ops), "items_changed": len(item_ops)}
+
+
+async def _patch_menu_doc(collection_name: str, doc_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    if not fields:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    if not ObjectId.is_valid(doc_id):
+        raise HTTPException(status_code=404, detail="Not found")
+    doc = collection(collection_name).find_one_and_update(
+        {"_id": ObjectId(doc_id)},
+        {"$set": {**fields, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not doc:
+        raise HTTPException(status_code=404, detail="Not found")
+    doc["_id"] = str(doc["_id"])
+    return {"ok": True, "version": _bump_menu_version(doc.get("outlet_id", DEFAULT_OUTLET_ID)), "doc": doc}
+
+
+@app.patch("/menu/categories/{category_id}")
+async def patch_menu_category(category_id: str, patch: MenuCategoryPatch):
+    return await _patch_menu_doc("menu_category", category_id, patch.model_dump(exclude_unset=True))
+
+
+@app.patch("/menu/items/{item_id}")
+async def patch_menu_item(item_id: str, patch: MenuItemPatch):
+    return await _patch_menu_doc("menu_item", item_id, patch.model_dump(exclude_unset=True))
 
 
 @app.get("/menu")
-async def get_menu():
-    cats = get_documents("menu_category", {"is_active": True}, limit=100)
-    items = get_documents("menu_item", {"is_active": True}, limit=1000)
-    return {"categories": cats, "items": items}
+async def get_menu(request: Request, response: Response, fields: Optional[str] = None, outlet_id: str = DEFAULT_OUTLET_ID):
+    version = _menu_version(outlet_id)
+    etag = f'"menu-{outlet_id}-{version}-{fields or ""}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    # fields= applies to items; categories are few and always returned whole
+    projection = _parse_fields(fields, _allowed_fields(MenuItem))
+    cats = get_documents("menu_category", {"outlet_id": outlet_id, "is_active": True}, limit=100)
+    items = get_documents("menu_item", {"outlet_id": outlet_id, "is_active": True}, limit=1000, projection=projection)
+    return {"version": version, "categories": cats, "items": items}
 
 
 # Orders
 @app.post("/orders")
 async def create_order(order: Order):
-    _id = create_document("order", order.model_dump())
+    _id = create_document("order", _with_outlet(order))
     return {"order_id": _id}
 
 
 @app.get("/orders")
-async def list_orders(status: Optional[str] = None):
-    q: Dict[str, Any] = {}
+async def list_orders(
+    outlet_id: str = DEFAULT_OUTLET_ID,
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    sort: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    after: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=1000),
+):
+    q: Dict[str, Any] = {"outlet_id": outlet_id}
     if status:
         q["status"] = status
-    orders = get_documents("order", q, limit=200)
-    return {"orders": orders}
+    args = _list_args(fields, sort, after, _allowed_fields(Order))
+    orders = get_documents("order", q, limit=limit, skip=skip, **args)
+    return {"orders": orders, "next_cursor": _next_cursor(orders, limit, sort)}
 
 
 # Bookings
 @app.post("/bookings")
 async def create_booking(booking: Booking):
-    _id = create_document("booking", booking.model_dump())
+    _id = create_document("booking", _with_outlet(booking))
     return {"booking_id": _id}
 
 
 @app.get("/bookings")
-async def list_bookings(date: Optional[str] = None):
-    q: Dict[str, Any] = {}
+async def list_bookings(
+    outlet_id: str = DEFAULT_OUTLET_ID,
+    date: Optional[str] = None,
+    fields: Optional[str] = None,
+    sort: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    after: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=1000),
+):
+    q: Dict[str, Any] = {"outlet_id": outlet_id}
     if date:
         q["date"] = date
-    bookings = get_documents("booking", q, limit=200)
-    return {"bookings": bookings}
+    args = _list_args(fields, sort, after, _allowed_fields(Booking))
+    bookings = get_documents("booking", q, limit=limit, skip=skip, **args)
+    return {"bookings": bookings, "next_cursor": _next_cursor(bookings, limit, sort)}
 
 
 # Tables
 @app.get("/tables")
-async def list_tables():
-    tables = get_documents("table", {}, limit=200)
-    return {"tables": tables}
+async def list_tables(
+    outlet_id: str = DEFAULT_OUTLET_ID,
+    fields: Optional[str] = None,
+    sort: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    after: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=1000),
+):
+    args = _list_args(fields, sort, after, _allowed_fields(Table))
+    tables = get_documents("table", {"outlet_id": outlet_id}, limit=limit, skip=skip, **args)
+    return {"tables": tables, "next_cursor": _next_cursor(tables, limit, sort)}
 
 
 @app.post("/tables")
 async def add_table(table: Table):
-    _id = create_document("table", table.model_dump())
+    _id = create_document("table", _with_outlet(table))
     return {"table_id": _id}
 
 
@@ -1,6 +1,6 @@
 from __future__ import annotations
-from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, List, Optional, Literal
 
 # Collections:
 # - user
@@ -17,12 +17,14 @@ class User(BaseModel):
     is_active: bool = True
 
 class MenuCategory(BaseModel):
+    outlet_id: Optional[str] = None
     name: str
     slug: str
     is_active: bool = True
     sort: int = 0
 
 class MenuItem(BaseModel):
+    outlet_id: Optional[str] = None
     category_slug: str
     name: str
     description: Optional[str] = None
@@ -31,6 +33,29 @@ class MenuItem(BaseModel):
     is_active: bool = True
     tags: List[str] = []
 
+def _not_null(value: Any) -> Any:
+    # PATCH fields may be omitted, but an explicit null would break the stored doc
+    if value is None:
+        raise ValueError("may be omitted but not null")
+    return value
+
+class MenuCategoryPatch(BaseModel):
+    name: Optional[str] = None
+    is_active: Optional[bool] = None
+    sort: Optional[int] = None
+
+    _no_nulls = field_validator("name", "is_active", "sort")(_not_null)
+
+class MenuItemPatch(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    image: Optional[str] = None
+    is_active: Optional[bool] = None
+    tags: Optional[List[str]] = None
+
+    _no_nulls = field_validator("name", "price", "is_active", "tags")(_not_null)
+
 class CartItem(BaseModel):
     item_id: str
     name: str
@@ -39,6 +64,7 @@ class CartItem(BaseModel):
     notes: Optional[str] = None
 
 class Order(BaseModel):
+    outlet_id: Optional[str] = None
     order_type: Literal["dine-in", "takeaway"]
     table_id: Optional[str] = None
     phone: Optional[str] = None
@@ -50,6 +76,7 @@ class Order(BaseModel):
     payment_method: Optional[Literal["cash", "card", "online"]] = None
 
 class Booking(BaseModel):
+    outlet_id: Optional[str] = None
     date: str  # YYYY-MM-DD
     time: str  # HH:MM
     name: str
@@ -58,6 +85,7 @@ class Booking(BaseModel):
     status: Literal["booked", "cancelled"] = "booked"
 
 class Table(BaseModel):
+    outlet_id: Optional[str] = None
     table_number: int
     qr_code: Optional[str] = None
     status: Literal["available", "occupied", "reserved"] = "available"
@@ -1,25 +1,375 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Dict, List
-from pymongo import MongoClient
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from bson import ObjectId
+from pymongo import MongoClient, DeleteOne, InsertOne, UpdateOne, monitoring
+from pymongo.collection import Collection
+from pymongo.read_preferences import Primary, SecondaryPreferred
+from pymongo.write_concern import WriteConcern
 
 DATABASE_URL = os.getenv("DATABASE_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "appdb")
+# Mongo rejects maxStalenessSeconds below 90
+READ_MAX_STALENESS_SECONDS = max(90, int(os.getenv("READ_MAX_STALENESS_SECONDS", "90")))
 
-client = MongoClient(DATABASE_URL)
-db = client[DATABASE_NAME]
+# Outlet (branch) used when a request doesn't name one
+DEFAULT_OUTLET_ID = os.getenv("DEFAULT_OUTLET_ID", "main")
 
+# Server-side cap on operations per write command (maxWriteBatchSize)
+MAX_WRITE_BATCH_SIZE = 100_000
+BULK_BATCH_SIZE = min(MAX_WRITE_BATCH_SIZE, int(os.getenv("BULK_BATCH_SIZE", "1000")))
 
-def create_document(collection_name: str, data: Dict[str, Any]) -> str:
-    now = datetime.utcnow()
+# "mongo" (default) or "memory": the embedded engine in storage.py, optionally
+# snapshotted to MEMORY_SNAPSHOT_PATH every MEMORY_SNAPSHOT_INTERVAL seconds
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+
+# Incremented from threadpool and job-worker threads
+_read_routing_lock = threading.Lock()
+_read_routing_counts: Dict[str, int] = {}
+_reads_served_by: Dict[str, int] = {}
+
+READ_COMMANDS = {"find", "aggregate", "count", "distinct"}
+
+
+class _ReadListener(monitoring.CommandListener):
+    # Counts read commands per server so routing can be checked end to end
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in READ_COMMANDS:
+            key = "%s:%s" % event.connection_id
+            with _read_routing_lock:
+                _reads_served_by[key] = _reads_served_by.get(key, 0) + 1
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+
+if STORAGE_BACKEND == "memory":
+    from storage import MemoryDatabase
+
+    client = None
+    db = MemoryDatabase(os.getenv("MEMORY_SNAPSHOT_PATH"))
+    if db.snapshot_path and os.getenv("MEMORY_SNAPSHOT_INTERVAL"):
+        db.start_snapshots(float(os.getenv("MEMORY_SNAPSHOT_INTERVAL")))
+else:
+    client = MongoClient(DATABASE_URL, event_listeners=[_ReadListener()])
+    db = client[DATABASE_NAME]
+
+# Read routing policy, by operation class. Anything that has to see its own
+# writes (order creation, payments, OTP checks) stays on "primary"; menu and
+# listing/reporting reads may be served by a slightly stale secondary.
+READ_POLICY = {
+    "primary": Primary(),
+    "menu": SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS),
+    "reporting": SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS),
+}
+
+
+def reader(collection_name: str, op: str = "primary") -> Collection:
+    pref = READ_POLICY[op]
+    key = f"{op}:{collection_name}:{pref.mongos_mode}"
+    with _read_routing_lock:
+        _read_routing_counts[key] = _read_routing_counts.get(key, 0) + 1
+    return db.get_collection(collection_name, read_preference=pref)
+
+
+@contextmanager
+def read_session() -> Iterator[Any]:
+    """Causally consistent session for a group of reads.
+
+    Secondary reads in one session see at least everything the earlier reads
+    saw, even if they land on different members. None on the memory backend.
+    """
+    if client is None:
+        yield None
+        return
+    with client.start_session(causal_consistency=True) as session:
+        yield session
+
+
+def read_routing_stats() -> Dict[str, Any]:
+    with _read_routing_lock:
+        reads = dict(_read_routing_counts)
+        served_by = dict(_reads_served_by)
+    stats: Dict[str, Any] = {
+        "policy": {
+            op: {"mode": pref.mongos_mode, "max_staleness": pref.max_staleness}
+            for op, pref in READ_POLICY.items()
+        },
+        "reads": reads,
+        "served_by": served_by,
+    }
+    if client is not None:
+        stats["primary"] = "%s:%s" % client.primary if client.primary else None
+        stats["secondaries"] = sorted("%s:%s" % addr for addr in client.secondaries)
+    return stats
+
+
+# Write durability profiles. Money-related writes wait for a journaled
+# majority; throwaway writes (OTP codes, analytics) are not acknowledged.
+WRITE_PROFILES = {
+    "critical": WriteConcern(w="majority", j=True),
+    "standard": WriteConcern(w=1),
+    "fire_and_forget": WriteConcern(w=0),
+}
+
+# Default profile per collection; anything not listed is "standard"
+COLLECTION_WRITE_PROFILES = {
+    "order": "critical",
+    "payment": "critical",
+    # Idempotency keys must survive a failover whenever the order/payment they
+    # guard does, or a retry would create it again
+    "idempotency": "critical",
+    "otp": "fire_and_forget",
+    "user_activities": "fire_and_forget",
+    "page_views": "fire_and_forget",
+}
+
+
+def writer(collection_name: str, durability: str | None = None) -> Collection:
+    profile = durability or COLLECTION_WRITE_PROFILES.get(collection_name, "standard")
+    return db.get_collection(collection_name, write_concern=WRITE_PROFILES[profile])
+
+
+# Per-outlet collections: every query names an outlet, so every index leads
+# with outlet_id, and {outlet_id, _id} is the shard key once we shard.
+OUTLET_INDEXES = {
+    "menucategory": [[("outlet_id", 1), ("menu_version", 1)]],
+    "menuitem": [[("outlet_id", 1), ("category_id", 1)], [("outlet_id", 1), ("menu_version", 1)]],
+    "order": [
+        [("outlet_id", 1), ("created_at", -1)],
+        [("outlet_id", 1), ("status", 1), ("created_at", -1)],
+        [("outlet_id", 1), ("customer_phone", 1), ("created_at", -1)],
+        [("outlet_id", 1), ("table_id", 1)],
+    ],
+    "booking": [[("outlet_id", 1), ("date", 1)]],
+    "payment": [[("outlet_id", 1), ("order_id", 1)]],
+}
+SHARD_KEYS = {name: {"outlet_id": 1, "_id": 1} for name in OUTLET_INDEXES}
+
+# Natural keys the menu import upserts on; unique so concurrent or retried
+# imports can't create a second copy. Older items without a slug are exempt.
+UNIQUE_INDEXES = {
+    "menucategory": [("outlet_id", 1), ("slug", 1)],
+    "menuitem": [("outlet_id", 1), ("category_id", 1), ("slug", 1)],
+}
+
+# Collections shared by all outlets
+GLOBAL_INDEXES = {
+    "customer": [[("phone", 1)]],
+    "otp": [[("phone", 1)]],
+}
+
+
+def ensure_indexes() -> None:
+    for collection_name, indexes in OUTLET_INDEXES.items():
+        for keys in indexes:
+            db[collection_name].create_index(keys)
+        db[collection_name].create_index(list(SHARD_KEYS[collection_name].items()))
+    for collection_name, indexes in GLOBAL_INDEXES.items():
+        for keys in indexes:
+            db[collection_name].create_index(keys)
+    for collection_name, keys in UNIQUE_INDEXES.items():
+        _ensure_unique_index(collection_name, keys)
+
+
+def _ensure_unique_index(collection_name: str, keys: List[Tuple[str, int]]) -> None:
+    col = db[collection_name]
+    if client is not None:
+        # Replace a plain index on the same keys left by an earlier release
+        for name, info in col.index_information().items():
+            if info["key"] == keys and not info.get("unique"):
+                col.drop_index(name)
+    col.create_index(keys, unique=True, partialFilterExpression={"slug": {"$type": "string"}})
+
+
+def shard_collections() -> None:
+    """Shard the per-outlet collections on SHARD_KEYS; run once against a mongos."""
+    if client is None:
+        raise RuntimeError("Sharding needs the mongo storage backend")
+    client.admin.command("enableSharding", DATABASE_NAME)
+    for collection_name, key in SHARD_KEYS.items():
+        client.admin.command("shardCollection", f"{DATABASE_NAME}.{collection_name}", key=key)
+
+
+def close_storage() -> None:
+    if STORAGE_BACKEND == "memory":
+        db.close()
+
+
+def backfill_outlet_id(outlet_id: str = DEFAULT_OUTLET_ID) -> Dict[str, int]:
+    """Assign documents written before outlets existed to ``outlet_id``."""
+    return {
+        name: db[name].update_many({"outlet_id": {"$exists": False}}, {"$set": {"outlet_id": outlet_id}}).modified_count
+        for name in OUTLET_INDEXES
+    }
+
+
+def _stamp_insert(data: Dict[str, Any], now: datetime) -> Dict[str, Any]:
     data["created_at"] = now
     data["updated_at"] = now
-    res = db[collection_name].insert_one(data)
+    return data
+
+
+def _stamp_update(fields: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    stamped = {k: v for k, v in fields.items() if k not in ("_id", "created_at")}
+    stamped["updated_at"] = now
+    return stamped
+
+
+def _as_filter(filter_or_id: Any) -> Dict[str, Any]:
+    if isinstance(filter_or_id, dict):
+        return filter_or_id
+    if isinstance(filter_or_id, str):
+        filter_or_id = ObjectId(filter_or_id)
+    return {"_id": filter_or_id}
+
+
+def create_document(collection_name: str, data: Dict[str, Any], durability: str | None = None) -> str:
+    _stamp_insert(data, datetime.utcnow())
+    res = writer(collection_name, durability).insert_one(data)
     return str(res.inserted_id)
 
 
-def get_documents(collection_name: str, filter_dict: Dict[str, Any] | None = None, limit: int | None = None) -> List[Dict[str, Any]]:
-    cursor = db[collection_name].find(filter_dict or {})
+def update_document(collection_name: str, filter_or_id: Any, data: Dict[str, Any], upsert: bool = False, durability: str | None = None) -> int | None:
+    """$set ``data`` on one document (by id or filter).
+
+    Returns the matched count, or None when the write was not acknowledged.
+    """
+    now = datetime.utcnow()
+    update: Dict[str, Any] = {"$set": _stamp_update(data, now)}
+    if upsert:
+        update["$setOnInsert"] = {"created_at": now}
+    res = writer(collection_name, durability).update_one(_as_filter(filter_or_id), update, upsert=upsert)
+    return res.matched_count if res.acknowledged else None
+
+
+def delete_document(collection_name: str, filter_or_id: Any, durability: str | None = None) -> int | None:
+    res = writer(collection_name, durability).delete_one(_as_filter(filter_or_id))
+    return res.deleted_count if res.acknowledged else None
+
+
+def _to_write_op(op: Any, now: datetime) -> Any:
+    # ("insert", doc) | ("update", filter, fields) | ("upsert", filter, fields)
+    # | ("delete", filter); anything else is passed through as a pymongo op.
+    if not isinstance(op, tuple):
+        return op
+    kind = op[0]
+    if kind == "insert":
+        return InsertOne(_stamp_insert(op[1], now))
+    if kind == "update":
+        return UpdateOne(_as_filter(op[1]), {"$set": _stamp_update(op[2], now)})
+    if kind == "upsert":
+        return UpdateOne(
+            _as_filter(op[1]),
+            {"$set": _stamp_update(op[2], now), "$setOnInsert": {"created_at": now}},
+            upsert=True,
+        )
+    if kind == "delete":
+        return DeleteOne(_as_filter(op[1]))
+    raise ValueError(f"Unknown bulk operation: {kind}")
+
+
+def _batches(items: Iterable[Any], size: int) -> Iterable[List[Any]]:
+    batch: List[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_STAT_KEYS = ("inserted", "matched", "modified", "upserted", "deleted")
+
+
+def _batch_stats(res: Any, size: int, started: float) -> Dict[str, Any]:
+    # Unacknowledged (w=0) results carry no counts
+    stats: Dict[str, Any] = {"size": size, "acknowledged": res.acknowledged}
+    for key in _STAT_KEYS:
+        stats[key] = getattr(res, f"{key}_count") if res.acknowledged else 0
+    stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return stats
+
+
+def _bulk_stats(batches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    totals = {k: sum(b[k] for b in batches) for k in _STAT_KEYS}
+    return {**totals, "batches": batches}
+
+
+def bulk_write(collection_name: str, operations: Iterable[Any], ordered: bool = False, batch_size: int = BULK_BATCH_SIZE, durability: str | None = None) -> Dict[str, Any]:
+    """Run write operations in batches of at most ``batch_size``.
+
+    Returns totals plus one stats entry per batch sent to the server.
+    """
+    col = writer(collection_name, durability)
+    now = datetime.utcnow()
+    batches: List[Dict[str, Any]] = []
+    for batch in _batches((_to_write_op(op, now) for op in operations), min(batch_size, MAX_WRITE_BATCH_SIZE)):
+        started = time.perf_counter()
+        res = col.bulk_write(batch, ordered=ordered)
+        batches.append(_batch_stats(res, len(batch), started))
+    return _bulk_stats(batches)
+
+
+def insert_many_documents(collection_name: str, docs: Iterable[Dict[str, Any]], ordered: bool = False, batch_size: int = BULK_BATCH_SIZE, durability: str | None = None) -> Dict[str, Any]:
+    """Insert ``docs`` in batches; ``inserted_ids`` follows input order."""
+    col = writer(collection_name, durability)
+    now = datetime.utcnow()
+    batches: List[Dict[str, Any]] = []
+    inserted_ids: List[Any] = []
+    for batch in _batches((_stamp_insert(d, now) for d in docs), min(batch_size, MAX_WRITE_BATCH_SIZE)):
+        started = time.perf_counter()
+        res = col.insert_many(batch, ordered=ordered)
+        # ids are assigned client-side, so they are known even when unacknowledged;
+        # the count is not, like every other count of a w=0 write
+        inserted_ids.extend(res.inserted_ids)
+        batches.append({
+            "size": len(batch),
+            "acknowledged": res.acknowledged,
+            "inserted": len(res.inserted_ids) if res.acknowledged else 0,
+            "matched": 0,
+            "modified": 0,
+            "upserted": 0,
+            "deleted": 0,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        })
+    return {**_bulk_stats(batches), "inserted_ids": inserted_ids}
+
+
+def bulk_upsert(collection_name: str, docs: Iterable[Dict[str, Any]], key: str | List[str], batch_size: int = BULK_BATCH_SIZE, durability: str | None = None) -> Dict[str, Any]:
+    """Upsert ``docs`` matched on the ``key`` field(s)."""
+    keys = [key] if isinstance(key, str) else key
+    ops = (("upsert", {k: d[k] for k in keys}, d) for d in docs)
+    return bulk_write(collection_name, ops, batch_size=batch_size, durability=durability)
+
+
+def get_documents(
+    collection_name: str,
+    filter_dict: Dict[str, Any] | None = None,
+    limit: int | None = None,
+    op: str = "primary",
+    projection: Dict[str, int] | None = None,
+    sort: List[Tuple[str, int]] | None = None,
+    skip: int = 0,
+    after: Any = None,
+) -> List[Dict[str, Any]]:
+    query = dict(filter_dict or {})
+    if after is not None:
+        # _id cursor: resume after the last document of the previous page
+        query["_id"] = {"$gt": ObjectId(after) if isinstance(after, str) else after}
+        sort = sort or [("_id", 1)]
+    cursor = reader(collection_name, op).find(query, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    if skip:
+        cursor = cursor.skip(skip)
     if limit:
         cursor = cursor.limit(limit)
     return list(cursor)
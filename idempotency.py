@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import DuplicateKeyError
+
+from database import writer
+
+COLLECTION = "idempotency"
+
+
+class IdempotencyStore:
+    """Remembers the first response for each Idempotency-Key.
+
+    Responses live in a small in-process LRU backed by a Mongo collection with
+    a TTL index, so retries are answered without re-running the handler even
+    after a restart or on another worker. Concurrent requests with the same
+    key are coalesced: one runs the handler, the rest wait for its response.
+    """
+
+    def __init__(self, ttl_seconds: int = 86_400, max_entries: int = 10_000,
+                 wait_timeout: float = 10.0, pending_timeout: float = 30.0):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self.pending_timeout = pending_timeout
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._counts = {"executed": 0, "replayed": 0, "coalesced": 0}
+
+    def ensure_indexes(self) -> None:
+        writer(COLLECTION).create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+
+    def run(self, key: Optional[str], scope: str, fingerprint: str, fn: Callable[[], Any]) -> Any:
+        """Run ``fn`` once per (scope, key) and return its JSON-encoded response."""
+        if not key:
+            return fn()
+        full_key = f"{scope}:{key}"
+        rec = self._get_local(full_key)
+        if rec is not None:
+            return self._replay(rec, fingerprint)
+
+        with self._lock:
+            event = self._inflight.get(full_key)
+            leader = event is None
+            if leader:
+                event = self._inflight[full_key] = threading.Event()
+        if not leader:
+            event.wait(self.wait_timeout)
+            rec = self._get_local(full_key)
+            if rec is None:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress")
+            self._count("coalesced")
+            return self._replay(rec, fingerprint)
+
+        try:
+            return self._run_once(full_key, fingerprint, fn)
+        finally:
+            with self._lock:
+                self._inflight.pop(full_key, None)
+            event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counts, "cached": len(self._local), "inflight": len(self._inflight)}
+
+    def _run_once(self, full_key: str, fingerprint: str, fn: Callable[[], Any]) -> Any:
+        col = writer(COLLECTION)
+        claimed = self._claim(full_key, fingerprint)
+        deadline = time.monotonic() + self.wait_timeout
+        while not claimed:
+            # Another worker owns the key; wait for its response
+            rec = col.find_one({"_id": full_key})
+            if rec is None:
+                claimed = self._claim(full_key, fingerprint)  # owner failed and released it
+            elif rec["status"] == "done":
+                self._put_local(full_key, rec)
+                self._count("coalesced")
+                return self._replay(rec, fingerprint)
+            elif rec["created_at"] < datetime.utcnow() - timedelta(seconds=self.pending_timeout):
+                claimed = self._claim(full_key, fingerprint, takeover=True)  # owner crashed
+            elif time.monotonic() >= deadline:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress")
+            else:
+                time.sleep(0.05)
+
+        try:
+            response = jsonable_encoder(fn())
+        except Exception:
+            # Failed requests aren't remembered, so the client can retry them
+            col.delete_one({"_id": full_key, "status": "pending"})
+            raise
+        col.update_one({"_id": full_key}, {"$set": {"status": "done", "response": response}})
+        self._put_local(full_key, {"fingerprint": fingerprint, "response": response})
+        self._count("executed")
+        return response
+
+    def _claim(self, full_key: str, fingerprint: str, takeover: bool = False) -> bool:
+        col = writer(COLLECTION)
+        now = datetime.utcnow()
+        doc = {"status": "pending", "fingerprint": fingerprint, "created_at": now}
+        if takeover:
+            cutoff = now - timedelta(seconds=self.pending_timeout)
+            res = col.update_one({"_id": full_key, "status": "pending", "created_at": {"$lt": cutoff}}, {"$set": doc})
+            return res.modified_count == 1
+        try:
+            col.insert_one({"_id": full_key, **doc})
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def _replay(self, rec: Dict[str, Any], fingerprint: str) -> Any:
+        if rec["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was reused with a different request")
+        self._count("replayed")
+        return rec["response"]
+
+    def _get_local(self, full_key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._local.get(full_key)
+            if entry is None:
+                return None
+            expires_at, rec = entry
+            if expires_at < time.monotonic():
+                del self._local[full_key]
+                return None
+            self._local.move_to_end(full_key)
+            return rec
+
+    def _put_local(self, full_key: str, rec: Dict[str, Any]) -> None:
+        with self._lock:
+            self._local[full_key] = (time.monotonic() + self.ttl_seconds,
+                                     {"fingerprint": rec["fingerprint"], "response": rec["response"]})
+            self._local.move_to_end(full_key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+
+idempotency = IdempotencyStore(
+    ttl_seconds=int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")),
+    max_entries=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000")),
+)
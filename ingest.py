@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+from database import insert_many_documents
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("block", "drop_oldest")
+
+
+class EventIngester:
+    """Buffers analytics events in memory and writes them in batches.
+
+    ``record`` never does I/O: events go on a bounded queue that a background
+    thread drains with ``insert_many`` once ``batch_size`` events are waiting
+    or ``flush_interval`` seconds have passed. When the queue is full the
+    ``drop_oldest`` policy evicts the oldest event, while ``block`` waits up to
+    ``put_timeout`` seconds for room and then drops the new one.
+    """
+
+    def __init__(self, max_queue: int = 10_000, batch_size: int = 500, flush_interval: float = 1.0,
+                 policy: str = "drop_oldest", put_timeout: float = 0.05):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.put_timeout = put_timeout
+        self._queue: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        # Set by stop(); record() then drops instead of starting a new writer
+        self._stopped = False
+        self._recorded = 0
+        self._written = 0
+        self._unacknowledged = 0
+        self._dropped = 0
+        self._failed = 0
+        self._flushes = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="event-ingester", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the writer after flushing whatever is still queued."""
+        with self._cond:
+            self._stopping = True
+            self._stopped = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    def record(self, collection_name: str, doc: Dict[str, Any]) -> bool:
+        """Queue one event; returns False if it was dropped."""
+        if self._thread is None and not self._stopped:
+            self.start()
+        with self._cond:
+            self._recorded += 1
+            if self._stopped:
+                self._dropped += 1
+                return False
+            if len(self._queue) >= self.max_queue:
+                if self.policy == "drop_oldest":
+                    self._queue.popleft()
+                    self._dropped += 1
+                elif not self._cond.wait_for(lambda: len(self._queue) < self.max_queue, self.put_timeout):
+                    self._dropped += 1
+                    return False
+            self._queue.append((collection_name, doc))
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def flush(self) -> int:
+        """Synchronously write everything queued so far; returns events written."""
+        written = 0
+        while True:
+            batch = self._take()
+            if not batch:
+                return written
+            written += self._write(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "policy": self.policy,
+                "queue_depth": len(self._queue),
+                "max_queue": self.max_queue,
+                "recorded": self._recorded,
+                "written": self._written,
+                "unacknowledged": self._unacknowledged,
+                "dropped": self._dropped,
+                "failed": self._failed,
+                "flushes": self._flushes,
+                "last_flush_ms": self._last_flush_ms,
+                "max_flush_ms": self._max_flush_ms,
+            }
+
+    def _take(self) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._cond:
+            n = min(self.batch_size, len(self._queue))
+            batch = [self._queue.popleft() for _ in range(n)]
+            if batch:
+                self._cond.notify_all()  # wake producers waiting for room
+            return batch
+
+    def _write(self, batch: List[Tuple[str, Dict[str, Any]]]) -> int:
+        by_collection: Dict[str, List[Dict[str, Any]]] = {}
+        for collection_name, doc in batch:
+            by_collection.setdefault(collection_name, []).append(doc)
+        started = time.perf_counter()
+        written = unacknowledged = failed = 0
+        for collection_name, docs in by_collection.items():
+            try:
+                res = insert_many_documents(collection_name, docs)
+                written += res["inserted"]
+                # w=0 collections: sent, but no count comes back
+                unacknowledged += sum(b["size"] for b in res["batches"] if not b["acknowledged"])
+            except Exception:
+                logger.exception("Failed to write %d events to %s", len(docs), collection_name)
+                failed += len(docs)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        with self._cond:
+            self._written += written
+            self._unacknowledged += unacknowledged
+            self._failed += failed
+            self._flushes += 1
+            self._last_flush_ms = elapsed_ms
+            self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+        return written
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stopping or len(self._queue) >= self.batch_size,
+                    self.flush_interval,
+                )
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+
+events = EventIngester(
+    max_queue=int(os.getenv("EVENTS_MAX_QUEUE", "10000")),
+    batch_size=int(os.getenv("EVENTS_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("EVENTS_FLUSH_INTERVAL", "1.0")),
+    policy=os.getenv("EVENTS_OVERFLOW_POLICY", "drop_oldest"),
+)
@@ -0,0 +1,195 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from pymongo import ReturnDocument
+
+from database import writer
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "jobs"
+
+
+class JobRunner:
+    """Runs post-commit side effects on a small pool of worker threads.
+
+    Jobs are persisted to the ``jobs`` collection before ``enqueue`` returns,
+    so they survive restarts; workers claim them with an atomic
+    find-and-modify, retry failures with exponential backoff, and re-queue
+    jobs whose worker died mid-run once their lease expires.
+    """
+
+    def __init__(self, workers: int = 4, max_attempts: int = 5, backoff_base: float = 2.0,
+                 poll_interval: float = 1.0, lease_seconds: float = 300.0, retention_seconds: float = 86400.0):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers: Dict[str, Callable[..., Any]] = {}
+        self._threads: List[threading.Thread] = []
+        self._wake = threading.Condition()
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._counts = {"enqueued": 0, "succeeded": 0, "retried": 0, "failed": 0, "running": 0}
+        self._last_wait_ms = 0.0
+        self._max_wait_ms = 0.0
+        self._last_run_ms = 0.0
+        self._max_run_ms = 0.0
+
+    def task(self, name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """Register a job handler; it is called with the job's payload as kwargs."""
+        def register(fn: Callable[..., Any]) -> Callable[..., Any]:
+            self._handlers[name] = fn
+            return fn
+        return register
+
+    def enqueue(self, name: str, delay: float = 0, **payload: Any) -> str:
+        if name not in self._handlers:
+            raise ValueError(f"Unknown job: {name}")
+        now = datetime.utcnow()
+        res = writer(COLLECTION).insert_one({
+            "name": name,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "run_at": now + timedelta(seconds=delay),
+            "created_at": now,
+            "updated_at": now,
+        })
+        self._count("enqueued")
+        with self._wake:
+            self._wake.notify()
+        return str(res.inserted_id)
+
+    def ensure_indexes(self) -> None:
+        col = writer(COLLECTION)
+        col.create_index([("status", 1), ("run_at", 1)])
+        # Succeeded jobs expire after retention_seconds; failed ones are kept
+        # for inspection (only done jobs get finished_at)
+        col.create_index("finished_at", expireAfterSeconds=int(self.retention_seconds),
+                         partialFilterExpression={"status": "done"})
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self.ensure_indexes()
+        self._stopping = False
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop claiming new jobs and wait for running ones to finish."""
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def stats(self) -> Dict[str, Any]:
+        col = writer(COLLECTION)
+        with self._lock:
+            counts = dict(self._counts)
+            latency = {
+                "last_wait_ms": self._last_wait_ms,
+                "max_wait_ms": self._max_wait_ms,
+                "last_run_ms": self._last_run_ms,
+                "max_run_ms": self._max_run_ms,
+            }
+        return {
+            "workers": self.workers,
+            "queue_depth": col.count_documents({"status": "queued"}),
+            "dead": col.count_documents({"status": "failed"}),
+            **counts,
+            **latency,
+        }
+
+    def _claim(self) -> Dict[str, Any] | None:
+        now = datetime.utcnow()
+        return writer(COLLECTION).find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                # lease expired: the worker running it is gone
+                {"status": "running", "lease_until": {"$lt": now}},
+            ]},
+            {"$set": {
+                "status": "running",
+                "worker": self.worker_id,
+                "started_at": now,
+                "lease_until": now + timedelta(seconds=self.lease_seconds),
+                "updated_at": now,
+            }, "$inc": {"attempts": 1}},
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def _run(self) -> None:
+        while not self._stopping:
+            try:
+                job = self._claim()
+            except Exception:
+                logger.exception("Failed to claim job")
+                job = None
+            if job is None:
+                with self._wake:
+                    if not self._stopping:
+                        self._wake.wait(self.poll_interval)
+                continue
+            self._execute(job)
+
+    def _execute(self, job: Dict[str, Any]) -> None:
+        col = writer(COLLECTION)
+        wait_ms = max(0.0, (job["started_at"] - job["run_at"]).total_seconds() * 1000)
+        self._count("running")
+        started = time.perf_counter()
+        try:
+            self._handlers[job["name"]](**job["payload"])
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job["_id"], job["name"])
+            now = datetime.utcnow()
+            if job["attempts"] >= self.max_attempts:
+                col.update_one({"_id": job["_id"]}, {"$set": {
+                    "status": "failed", "last_error": repr(e), "updated_at": now,
+                }})
+                self._count("failed")
+            else:
+                delay = self.backoff_base ** job["attempts"]
+                col.update_one({"_id": job["_id"]}, {"$set": {
+                    "status": "queued", "last_error": repr(e),
+                    "run_at": now + timedelta(seconds=delay), "updated_at": now,
+                }})
+                self._count("retried")
+        else:
+            now = datetime.utcnow()
+            col.update_one({"_id": job["_id"]}, {"$set": {"status": "done", "finished_at": now, "updated_at": now}})
+            self._count("succeeded")
+        finally:
+            run_ms = round((time.perf_counter() - started) * 1000, 2)
+            with self._lock:
+                self._counts["running"] -= 1
+                self._last_wait_ms = round(wait_ms, 2)
+                self._max_wait_ms = max(self._max_wait_ms, self._last_wait_ms)
+                self._last_run_ms = run_ms
+                self._max_run_ms = max(self._max_run_ms, run_ms)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+
+jobs = JobRunner(
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "5")),
+    retention_seconds=float(os.getenv("JOB_RETENTION_SECONDS", "86400")),
+)
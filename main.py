@@ -1,15 +1,28 @@
-from fastapi import FastAPI, HTTPException, Body, Request
+from fastapi import FastAPI, HTTPException, Body, Depends, Header, Query, Request, Response
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from bson import ObjectId
+import hmac
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
 
-from database import db, create_document, get_documents
+from database import (
+    db, reader, writer, read_session, read_routing_stats, DEFAULT_OUTLET_ID, ensure_indexes, backfill_outlet_id, close_storage,
+    create_document, get_documents, update_document, delete_document, bulk_write,
+)
+from ingest import events
+from idempotency import idempotency
+from jobs import jobs
+from profiler import profiler, ProfilerBusy, MAX_SECONDS, MIN_INTERVAL
+from watchdog import watchdog
 from schemas import (
-    CustomerCreate, CustomerOut,
+    CustomerCreate, CustomerOut, CustomerSummaryOut,
     MenuImportPayload, MenuCategoryOut, MenuItemOut,
+    MenuItemPatch, MenuCategoryPatch, MenuChangesOut,
     OrderCreateItem, OrderCreate, OrderOut,
     BookingCreate, BookingOut,
     PaymentCreate, PaymentOut
@@ -26,17 +39,43 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+def start_background_writers():
+    ensure_indexes()
+    idempotency.ensure_indexes()
+    events.start()
+    jobs.start()
+    watchdog.start()
+
+
+@app.on_event("shutdown")
+def stop_background_writers():
+    watchdog.stop()
+    jobs.stop()
+    events.stop()
+    close_storage()
+
+
 def oid(obj: Any) -> str:
     if isinstance(obj, ObjectId):
         return str(obj)
     return obj
 
 
+def _stringify_ids(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _stringify_ids(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_stringify_ids(v) for v in value]
+    return oid(value)
+
+
 def serialize(doc: Dict[str, Any]) -> Dict[str, Any]:
     if not doc:
         return doc
     doc["id"] = oid(doc.pop("_id"))
-    return doc
+    # nested ids too (line items' item_id, payments' order_id)
+    return _stringify_ids(doc)
 
 
 @app.get("/")
@@ -60,58 +99,264 @@ def test_db():
         return {"backend": "fastapi", "database": "mongodb", "connection_status": f"error: {e}"}
 
 
+@app.get("/admin/metrics")
+def metrics():
+    return {
+        "read_routing": read_routing_stats(),
+        "events": events.stats(),
+        "idempotency": idempotency.stats(),
+        "jobs": jobs.stats(),
+        "watchdog": watchdog.stats(),
+    }
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Admin tooling is off unless ADMIN_TOKEN is set
+    token = os.getenv("ADMIN_TOKEN")
+    if not token or not x_admin_token or not hmac.compare_digest(token, x_admin_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.get("/admin/profile", dependencies=[Depends(require_admin)])
+def profile(
+    seconds: float = Query(10, gt=0, le=MAX_SECONDS),
+    interval: float = Query(0.01, ge=MIN_INTERVAL, le=1),
+    top: int = Query(25, ge=1),
+    format: str = "json",
+):
+    # Samples all threads (threadpool workers and the event loop) of this worker
+    try:
+        result = profiler.profile(seconds, interval, top)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    if format == "collapsed":
+        return PlainTextResponse(result["collapsed"])
+    return result
+
+
+@app.post("/admin/customers/summaries/rebuild", dependencies=[Depends(require_admin)])
+def rebuild_summaries():
+    # One-off: build summaries for customers who ordered before they existed
+    return {"job_id": jobs.enqueue("rebuild_customer_summaries")}
+
+
+@app.post("/admin/outlets/backfill", dependencies=[Depends(require_admin)])
+def backfill_outlets(outlet_id: str = Body(DEFAULT_OUTLET_ID, embed=True)):
+    # One-off: assign pre-outlet documents to an outlet
+    return {"updated": backfill_outlet_id(outlet_id)}
+
+
 # ============== MENU ==================
+# Every menu change reserves the next menu version, tags the categories/items
+# it writes with it, and only then publishes it. Readers (ETag, menu cache,
+# /menu/changes) only ever see the published version, so they never pair a
+# new version with documents from before the change.
+MENU_CATEGORY_FIELDS = ("name", "order", "disabled")
+MENU_ITEM_FIELDS = ("category_id", "name", "price", "image", "description", "options", "disabled")
+# Natural keys, matching UNIQUE_INDEXES in database.py
+MENU_CATEGORY_KEY = ("outlet_id", "slug")
+MENU_ITEM_KEY = ("outlet_id", "category_id", "slug")
+
+
+def slugify(name: str) -> str:
+    return name.lower().replace(" ", "-")
+
+
+def menu_version(outlet_id: str, op: str = "primary", session: Any = None) -> int:
+    doc = reader("meta", op).find_one({"_id": f"menu:{outlet_id}"}, session=session)
+    if not doc:
+        return 0
+    # meta docs from before publishing only have "version"
+    return doc.get("published", doc.get("version", 0))
+
+
+def reserve_menu_version(outlet_id: str) -> int:
+    doc = writer("meta").find_one_and_update(
+        {"_id": f"menu:{outlet_id}"}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return doc["version"]
+
+
+def publish_menu_version(outlet_id: str, version: int) -> None:
+    # Never moves backwards if a later reservation was published first
+    writer("meta").update_one(
+        {"_id": f"menu:{outlet_id}", "$or": [{"published": {"$lt": version}}, {"published": {"$exists": False}}]},
+        {"$set": {"published": version}},
+    )
+
+
+# outlet_id -> (menu version, built menu)
+_menu_cache: Dict[str, tuple] = {}
+
+
+def category_out(c: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(c["_id"]),
+        "name": c.get("name"),
+        "slug": c.get("slug"),
+        "order": c.get("order", 0),
+        "disabled": c.get("disabled", False),
+    }
+
+
+def menu_item_out(it: Dict[str, Any]) -> Dict[str, Any]:
+    it = serialize(it)
+    it["category_id"] = oid(it.get("category_id"))
+    return it
+
+
 @app.get("/menu", response_model=List[MenuCategoryOut])
-def get_menu():
+def get_menu(request: Request, response: Response, outlet_id: str = DEFAULT_OUTLET_ID):
+    with read_session() as session:
+        return _get_menu(request, response, outlet_id, session)
+
+
+def _get_menu(request: Request, response: Response, outlet_id: str, session: Any) -> Any:
+    # The session keeps the document reads at least as fresh as the version
+    # read, even when they are served by different secondaries
+    version = menu_version(outlet_id, "menu", session)
+    etag = f'"menu-{outlet_id}-{version}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    cached = _menu_cache.get(outlet_id)
+    if cached and cached[0] == version:
+        return cached[1]
     # Build categories with items
-    categories = list(db["menucategory"].find({"disabled": {"$ne": True}}).sort("order", 1))
+    categories = list(reader("menucategory", "menu").find({"outlet_id": outlet_id, "disabled": {"$ne": True}}, session=session).sort("order", 1))
     cat_ids = [c["_id"] for c in categories]
-    items = list(db["menuitem"].find({"category_id": {"$in": cat_ids}, "disabled": {"$ne": True}}))
+    items = list(reader("menuitem", "menu").find({"outlet_id": outlet_id, "category_id": {"$in": cat_ids}, "disabled": {"$ne": True}}, session=session))
     items_by_cat: Dict[str, List[Dict[str, Any]]] = {}
     for it in items:
-        items_by_cat.setdefault(str(it.get("category_id")), []).append(serialize(it))
+        items_by_cat.setdefault(str(it.get("category_id")), []).append(menu_item_out(it))
     result: List[Dict[str, Any]] = []
     for c in categories:
-        result.append({
-            "id": str(c["_id"]),
-            "name": c.get("name"),
-            "slug": c.get("slug"),
-            "order": c.get("order", 0),
-            "items": items_by_cat.get(str(c["_id"]), [])
-        })
+        result.append({**category_out(c), "items": items_by_cat.get(str(c["_id"]), [])})
+    _menu_cache[outlet_id] = (version, result)
     return result
 
 
-@app.post("/admin/menu/import")
-def import_menu(payload: MenuImportPayload):
-    # Clear existing
-    db["menucategory"].delete_many({})
-    db["menuitem"].delete_many({})
+@app.get("/menu/changes", response_model=MenuChangesOut)
+def menu_changes(since: int = 0, outlet_id: str = DEFAULT_OUTLET_ID):
+    # Read from the primary; changes tagged with a reserved but unpublished
+    # version are left for the next poll, so since=version never skips them
+    version = menu_version(outlet_id)
+    q = {"outlet_id": outlet_id, "menu_version": {"$gt": since, "$lte": version}}
+    categories = [category_out(c) for c in reader("menucategory").find(q)]
+    items = [menu_item_out(it) for it in reader("menuitem").find(q)]
+    return {"version": version, "categories": categories, "items": items}
+
+
+@app.patch("/admin/menu/items/{item_id}", response_model=MenuItemOut)
+def patch_menu_item(item_id: str, patch: MenuItemPatch):
+    fields = patch.model_dump(exclude_unset=True)
+    if not fields:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    item = reader("menuitem").find_one({"_id": ObjectId(item_id)}, {"outlet_id": 1}) if ObjectId.is_valid(item_id) else None
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    outlet_id = item.get("outlet_id", DEFAULT_OUTLET_ID)
+    fields["menu_version"] = reserve_menu_version(outlet_id)
+    update_document("menuitem", item_id, fields)
+    publish_menu_version(outlet_id, fields["menu_version"])
+    return menu_item_out(reader("menuitem").find_one({"_id": ObjectId(item_id)}))
+
+
+@app.patch("/admin/menu/categories/{category_id}", response_model=MenuCategoryOut)
+def patch_menu_category(category_id: str, patch: MenuCategoryPatch):
+    fields = patch.model_dump(exclude_unset=True)
+    if not fields:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    cat = reader("menucategory").find_one({"_id": ObjectId(category_id)}, {"outlet_id": 1}) if ObjectId.is_valid(category_id) else None
+    if not cat:
+        raise HTTPException(status_code=404, detail="Category not found")
+    outlet_id = cat.get("outlet_id", DEFAULT_OUTLET_ID)
+    fields["menu_version"] = reserve_menu_version(outlet_id)
+    update_document("menucategory", category_id, fields)
+    publish_menu_version(outlet_id, fields["menu_version"])
+    return category_out(reader("menucategory").find_one({"_id": ObjectId(category_id)}))
+
+
+def _diff_ops(existing: Dict[Any, Dict[str, Any]], desired: Dict[Any, Dict[str, Any]], fields: tuple) -> List[tuple]:
+    # Changed or new documents are written; ones missing from the import are
+    # disabled rather than deleted so their ids stay valid.
+    ops: List[tuple] = []
+    for key, doc in desired.items():
+        cur = existing.get(key)
+        if cur is None:
+            ops.append(("insert", doc))
+        elif any(cur.get(f) != doc[f] for f in fields):
+            ops.append(("update", cur["_id"], {f: doc[f] for f in fields}))
+    for key, cur in existing.items():
+        if key not in desired and not cur.get("disabled"):
+            ops.append(("update", cur["_id"], {"disabled": True}))
+    return ops
+
+
+def _tag_ops(ops: List[tuple], version: int, key_fields: tuple) -> List[tuple]:
+    # New docs are upserted on their natural key (unique-indexed), so an
+    # import racing or retrying this one updates the same document
+    return [("upsert", {f: op[1][f] for f in key_fields}, {**op[1], "menu_version": version}) if op[0] == "insert"
+            else (op[0], op[1], {**op[2], "menu_version": version}) for op in ops]
+
 
-    # Insert categories and items
+@app.post("/admin/menu/import")
+def import_menu(payload: MenuImportPayload, outlet_id: str = DEFAULT_OUTLET_ID):
+    # Diff against what is stored and upsert by slug; unchanged docs aren't touched
+    existing_cats = {c["slug"]: c for c in reader("menucategory").find({"outlet_id": outlet_id})}
+    desired_cats = {}
     for idx, cat in enumerate(payload.categories):
-        cat_doc = {
+        slug = cat.slug or slugify(cat.name)
+        desired_cats[slug] = {
+            "outlet_id": outlet_id,
             "name": cat.name,
-            "slug": cat.slug or cat.name.lower().replace(" ", "-"),
+            "slug": slug,
             "order": cat.order if cat.order is not None else idx,
             "disabled": False,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
         }
-        cat_id = db["menucategory"].insert_one(cat_doc).inserted_id
+    cat_ops = _diff_ops(existing_cats, desired_cats, MENU_CATEGORY_FIELDS)
+
+    # New categories don't have ids yet, so item diffs key on category slug
+    slug_by_cat_id = {c["_id"]: slug for slug, c in existing_cats.items()}
+    existing_items = {
+        (slug_by_cat_id.get(it.get("category_id")), it.get("slug") or slugify(it["name"])): it
+        for it in reader("menuitem").find({"outlet_id": outlet_id})
+    }
+    desired_items = {}
+    for cat in payload.categories:
+        cat_slug = cat.slug or slugify(cat.name)
+        cat_id = existing_cats[cat_slug]["_id"] if cat_slug in existing_cats else None
         for item in cat.items:
-            db["menuitem"].insert_one({
+            slug = item.slug or slugify(item.name)
+            desired_items[(cat_slug, slug)] = {
+                "outlet_id": outlet_id,
                 "category_id": cat_id,
                 "name": item.name,
+                "slug": slug,
                 "price": item.price,
                 "image": item.image,
                 "description": item.description,
                 "options": item.options or {},
                 "disabled": item.disabled or False,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow(),
-            })
-    return {"status": "ok"}
+            }
+    item_ops = _diff_ops(existing_items, desired_items, MENU_ITEM_FIELDS)
+    if not cat_ops and not item_ops:
+        return {"status": "ok", "version": menu_version(outlet_id), "categories_changed": 0, "items_changed": 0}
+
+    version = reserve_menu_version(outlet_id)
+    if cat_ops:
+        bulk_write("menucategory", _tag_ops(cat_ops, version, MENU_CATEGORY_KEY), ordered=True)
+    # Fill in ids of categories created above
+    new_slugs = [slug for slug in desired_cats if slug not in existing_cats]
+    if new_slugs:
+        new_ids = {c["slug"]: c["_id"] for c in reader("menucategory").find({"outlet_id": outlet_id, "slug": {"$in": new_slugs}}, {"slug": 1})}
+        for (cat_slug, _), doc in desired_items.items():
+            if doc["category_id"] is None:
+                doc["category_id"] = new_ids[cat_slug]
+    if item_ops:
+        bulk_write("menuitem", _tag_ops(item_ops, version, MENU_ITEM_KEY))
+    publish_menu_version(outlet_id, version)
+    return {"status": "ok", "version": version, "categories_changed": len(cat_ops), "items_changed": len(item_ops)}
 
 
 # ============== AUTH / CUSTOMERS ==================
@@ -119,46 +364,74 @@ def import_menu(payload: MenuImportPayload):
 def send_otp(phone: str = Body(..., embed=True)):
     # Demo OTP flow
     code = "1234"
-    db["otp"].update_one({"phone": phone}, {"$set": {"phone": phone, "code": code, "created_at": datetime.utcnow()}}, upsert=True)
+    writer("otp").update_one({"phone": phone}, {"$set": {"phone": phone, "code": code, "created_at": datetime.utcnow()}}, upsert=True)
     return {"sent": True, "debug_code": code}
 
 
 @app.post("/auth/verify_otp", response_model=CustomerOut)
 def verify_otp(phone: str = Body(..., embed=True), code: str = Body(..., embed=True), name: Optional[str] = Body(None, embed=True)):
-    rec = db["otp"].find_one({"phone": phone})
+    rec = reader("otp").find_one({"phone": phone})
     if not rec or rec.get("code") != code:
         raise HTTPException(status_code=400, detail="Invalid code")
 
-    existing = db["customer"].find_one({"phone": phone})
+    existing = reader("customer").find_one({"phone": phone})
     if existing:
-        db["otp"].delete_one({"phone": phone})
+        delete_document("otp", {"phone": phone})
         return CustomerOut(id=str(existing["_id"]), name=existing.get("name"), phone=existing.get("phone"))
 
     if not name:
         raise HTTPException(status_code=400, detail="Name required for new customer")
 
     cust_id = create_document("customer", {"name": name, "phone": phone})
-    db["otp"].delete_one({"phone": phone})
-    cust = db["customer"].find_one({"_id": ObjectId(cust_id)})
+    delete_document("otp", {"phone": phone})
+    cust = reader("customer").find_one({"_id": ObjectId(cust_id)})
     return CustomerOut(id=cust_id, name=cust.get("name"), phone=cust.get("phone"))
 
 
 @app.get("/customers/{phone}", response_model=Optional[CustomerOut])
 def get_customer(phone: str):
-    cust = db["customer"].find_one({"phone": phone})
+    cust = reader("customer").find_one({"phone": phone})
     if not cust:
         return None
     return CustomerOut(id=str(cust["_id"]), name=cust.get("name"), phone=cust.get("phone"))
 
 
+@app.get("/customers/{phone}/summary", response_model=CustomerSummaryOut)
+def get_customer_summary(phone: str):
+    # One read by _id; kept current by the update_customer_summary job
+    summary = reader("customer_summary").find_one({"_id": phone})
+    if not summary:
+        return CustomerSummaryOut(phone=phone)
+    counts = summary.get("item_counts", {})
+    favourites = sorted(
+        ({"item_id": item_id, **c} for item_id, c in counts.items()),
+        key=lambda c: c.get("qty", 0), reverse=True,
+    )[:SUMMARY_FAVOURITES]
+    recent = [{**o, "order_id": oid(o["order_id"])} for o in summary.get("recent_orders", [])]
+    return CustomerSummaryOut(
+        phone=phone,
+        order_count=summary.get("order_count", 0),
+        visit_count=summary.get("visit_count", 0),
+        lifetime_spend=round(summary.get("lifetime_spend", 0.0), 2),
+        recent_orders=recent,
+        favourites=favourites,
+    )
+
+
 # ============== ORDERS & PAYMENTS ==================
 @app.post("/orders", response_model=OrderOut)
-def create_order(order: OrderCreate):
+def create_order(order: OrderCreate, idempotency_key: Optional[str] = Header(None)):
+    # Retries with the same Idempotency-Key get the first response back
+    return idempotency.run(idempotency_key, "orders", order.model_dump_json(), lambda: _create_order(order))
+
+
+def _create_order(order: OrderCreate) -> OrderOut:
+    outlet_id = order.outlet_id or DEFAULT_OUTLET_ID
     # Compute totals
     total = 0.0
     line_items = []
     for it in order.items:
-        item = db["menuitem"].find_one({"_id": ObjectId(it.item_id)})
+        item = reader("menuitem").find_one({"_id": ObjectId(it.item_id), "outlet_id": outlet_id})
         if not item:
             raise HTTPException(status_code=404, detail=f"Item {it.item_id} not found")
         price = float(item.get("price", 0)) * it.qty
@@ -174,6 +447,7 @@ def create_order(order: OrderCreate):
         })
 
     doc = {
+        "outlet_id": outlet_id,
         "customer_phone": order.customer_phone,
         "table_id": order.table_id,
         "type": order.type,
@@ -184,38 +458,48 @@ def create_order(order: OrderCreate):
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow(),
     }
-    oid_ = db["order"].insert_one(doc).inserted_id
-    out = db["order"].find_one({"_id": oid_})
+    oid_ = writer("order").insert_one(doc).inserted_id
+    if order.customer_phone:
+        jobs.enqueue("update_customer_summary", order_id=str(oid_), event="created")
+    out = reader("order").find_one({"_id": oid_})
     return OrderOut(**serialize(out))
 
 
 @app.get("/orders", response_model=List[OrderOut])
-def list_orders(status: Optional[str] = None, phone: Optional[str] = None):
-    q: Dict[str, Any] = {}
+def list_orders(status: Optional[str] = None, phone: Optional[str] = None, outlet_id: str = DEFAULT_OUTLET_ID):
+    q: Dict[str, Any] = {"outlet_id": outlet_id}
     if status:
         q["status"] = status
     if phone:
         q["customer_phone"] = phone
-    orders = [serialize(o) for o in db["order"].find(q).sort("created_at", -1)]
+    # A customer's own history is read right after ordering, so it must see
+    # their writes; staff status listings can tolerate a stale secondary
+    op = "primary" if phone else "reporting"
+    orders = [serialize(o) for o in reader("order", op).find(q).sort("created_at", -1)]
     return [OrderOut(**o) for o in orders]
 
 
 @app.post("/orders/{order_id}/status")
 def update_order_status(order_id: str, status: str = Body(..., embed=True)):
-    res = db["order"].update_one({"_id": ObjectId(order_id)}, {"$set": {"status": status, "updated_at": datetime.utcnow()}})
-    if res.matched_count == 0:
+    if update_document("order", order_id, {"status": status}) == 0:
         raise HTTPException(status_code=404, detail="Order not found")
+    jobs.enqueue("notify_order_status", order_id=order_id, status=status)
     return {"status": "ok"}
 
 
 @app.post("/payments/create", response_model=PaymentOut)
-def create_payment(p: PaymentCreate):
-    order = db["order"].find_one({"_id": ObjectId(p.order_id)})
+def create_payment(p: PaymentCreate, idempotency_key: Optional[str] = Header(None)):
+    return idempotency.run(idempotency_key, "payments", p.model_dump_json(), lambda: _create_payment(p))
+
+
+def _create_payment(p: PaymentCreate) -> PaymentOut:
+    order = reader("order").find_one({"_id": ObjectId(p.order_id)})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     amount = p.amount if p.amount is not None else order.get("total", 0)
 
     pay_doc = {
+        "outlet_id": order.get("outlet_id", DEFAULT_OUTLET_ID),
         "order_id": order["_id"],
         "amount": amount,
         "gateway": p.gateway or "demo",
@@ -223,9 +507,9 @@ def create_payment(p: PaymentCreate):
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow(),
     }
-    pid = db["payment"].insert_one(pay_doc).inserted_id
+    pid = writer("payment").insert_one(pay_doc).inserted_id
     payment_url = f"/payments/redirect?pid={pid}"
-    out = db["payment"].find_one({"_id": pid})
+    out = reader("payment").find_one({"_id": pid})
     s = serialize(out)
     s["payment_url"] = payment_url
     return PaymentOut(**s)  # type: ignore
@@ -233,19 +517,26 @@ def create_payment(p: PaymentCreate):
 
 @app.post("/payments/webhook")
 def payment_webhook(pid: str = Body(..., embed=True), status: str = Body("success", embed=True)):
-    pay = db["payment"].find_one({"_id": ObjectId(pid)})
+    pay = reader("payment").find_one({"_id": ObjectId(pid)})
     if not pay:
         raise HTTPException(status_code=404, detail="Payment not found")
-    db["payment"].update_one({"_id": pay["_id"]}, {"$set": {"status": status, "updated_at": datetime.utcnow()}})
+    update_document("payment", pay["_id"], {"status": status})
     if status == "success":
-        db["order"].update_one({"_id": pay["order_id"]}, {"$set": {"payment_status": "paid", "status": "confirmed", "updated_at": datetime.utcnow()}})
+        update_document("order", pay["order_id"], {"payment_status": "paid", "status": "confirmed"})
+        jobs.enqueue("notify_order_status", order_id=str(pay["order_id"]), status="confirmed")
+        jobs.enqueue("update_customer_summary", order_id=str(pay["order_id"]), event="paid")
     return {"ok": True}
 
 
 # ============== BOOKINGS ==================
 @app.post("/bookings", response_model=BookingOut)
-def create_booking(b: BookingCreate):
+def create_booking(b: BookingCreate, idempotency_key: Optional[str] = Header(None)):
+    return idempotency.run(idempotency_key, "bookings", b.model_dump_json(), lambda: _create_booking(b))
+
+
+def _create_booking(b: BookingCreate) -> BookingOut:
     doc = {
+        "outlet_id": b.outlet_id or DEFAULT_OUTLET_ID,
         "name": b.name,
         "phone": b.phone,
         "party_size": b.party_size,
@@ -255,30 +546,29 @@ def create_booking(b: BookingCreate):
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow(),
     }
-    bid = db["booking"].insert_one(doc).inserted_id
-    out = db["booking"].find_one({"_id": bid})
+    bid = writer("booking").insert_one(doc).inserted_id
+    out = reader("booking").find_one({"_id": bid})
     return BookingOut(**serialize(out))
 
 
 @app.get("/bookings", response_model=List[BookingOut])
-def list_bookings():
-    docs = [serialize(d) for d in db["booking"].find({}).sort("date", 1)]
+def list_bookings(outlet_id: str = DEFAULT_OUTLET_ID):
+    docs = [serialize(d) for d in reader("booking", "reporting").find({"outlet_id": outlet_id}).sort("date", 1)]
     return [BookingOut(**d) for d in docs]
 
 
 @app.delete("/bookings/{booking_id}")
 def cancel_booking(booking_id: str):
-    res = db["booking"].update_one({"_id": ObjectId(booking_id)}, {"$set": {"status": "cancelled", "updated_at": datetime.utcnow()}})
-    if res.matched_count == 0:
+    if update_document("booking", booking_id, {"status": "cancelled"}) == 0:
         raise HTTPException(status_code=404, detail="Booking not found")
     return {"status": "cancelled"}
 
 
 # ============== TABLES ==================
 @app.get("/tables/status")
-def table_status():
+def table_status(outlet_id: str = DEFAULT_OUTLET_ID):
     # Simple table map: derive from recent orders (demo)
-    orders = list(db["order"].find({"table_id": {"$ne": None}}))
+    orders = list(reader("order", "reporting").find({"outlet_id": outlet_id, "table_id": {"$ne": None}}))
     status: Dict[str, str] = {}
     for o in orders:
         t = o.get("table_id")
@@ -287,3 +577,132 @@ def table_status():
         ps = o.get("payment_status", "unpaid")
         status[str(t)] = "occupied" if ps != "paid" else "available"
     return status
+
+
+# ============== BACKGROUND JOBS ==================
+ORDER_STATUS_MESSAGES = {
+    "confirmed": "Payment received, your order is confirmed.",
+    "ready": "Your order is ready for pickup.",
+    "cancelled": "Your order was cancelled.",
+}
+
+
+@jobs.task("notify_order_status")
+def notify_order_status(order_id: str, status: str):
+    message = ORDER_STATUS_MESSAGES.get(status)
+    if not message:
+        return
+    order = reader("order").find_one({"_id": ObjectId(order_id)}, {"customer_phone": 1})
+    if not order or not order.get("customer_phone"):
+        return
+    create_document("notification", {
+        "customer_phone": order["customer_phone"],
+        "order_id": order["_id"],
+        "title": f"Order {status}",
+        "message": message,
+        "type": "info",
+        "is_read": False,
+    })
+
+
+# Per-customer summary document (_id = phone) for the reorder/history screens
+SUMMARY_RECENT_ORDERS = 10
+SUMMARY_FAVOURITES = 5
+# "event:order_id" keys already counted; a retry only ever concerns a recent
+# event, so older keys are trimmed
+SUMMARY_APPLIED_KEEP = 200
+
+
+def _summary_entry(order: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "order_id": order["_id"],
+        "outlet_id": order.get("outlet_id"),
+        "total": order.get("total", 0),
+        "items": [{"item_id": str(li["item_id"]), "name": li.get("name"), "qty": li.get("qty", 1)} for li in order.get("items", [])],
+        "payment_status": order.get("payment_status", "unpaid"),
+        "created_at": order.get("created_at"),
+    }
+
+
+@jobs.task("update_customer_summary")
+def update_customer_summary(order_id: str, event: str):
+    order = reader("order").find_one({"_id": ObjectId(order_id)})
+    if not order or not order.get("customer_phone"):
+        return
+    phone = order["customer_phone"]
+    summaries = writer("customer_summary")
+    now = datetime.utcnow()
+    if event == "created":
+        inc: Dict[str, Any] = {"order_count": 1}
+        names: Dict[str, Any] = {}
+        for li in order.get("items", []):
+            key = f"item_counts.{li['item_id']}"
+            inc[f"{key}.qty"] = inc.get(f"{key}.qty", 0) + li.get("qty", 1)
+            names[f"{key}.name"] = li.get("name")
+        update: Dict[str, Any] = {
+            "$push": {"recent_orders": {"$each": [_summary_entry(order)], "$position": 0, "$slice": SUMMARY_RECENT_ORDERS}},
+            "$inc": inc,
+            "$set": {**names, "updated_at": now},
+            "$setOnInsert": {"created_at": now},
+        }
+    else:
+        # Idempotent, so it can run before (and outside) the guarded write
+        summaries.update_one(
+            {"_id": phone, "recent_orders.order_id": order["_id"]},
+            {"$set": {"recent_orders.$.payment_status": "paid"}},
+        )
+        update = {
+            "$inc": {"lifetime_spend": order.get("total", 0), "visit_count": 1},
+            "$set": {"updated_at": now},
+            "$setOnInsert": {"created_at": now},
+        }
+    # Checking and recording the event in the same write means a retried job
+    # (even after a crash mid-run) can neither skip nor double-count it
+    applied = f"{event}:{order_id}"
+    update.setdefault("$push", {})["applied"] = {"$each": [applied], "$slice": -SUMMARY_APPLIED_KEEP}
+    try:
+        summaries.update_one({"_id": phone, "applied": {"$ne": applied}}, update, upsert=True)
+    except DuplicateKeyError:
+        pass  # the summary exists and already has this event
+
+
+@jobs.task("rebuild_customer_summaries")
+def rebuild_customer_summaries():
+    """Recompute every customer summary from the order collection.
+
+    One-off for orders placed before summaries existed; run it while no
+    update_customer_summary jobs are queued, since it overwrites the summaries.
+    """
+    acc: Dict[str, Dict[str, Any]] = {}
+    for order in reader("order", "reporting").find({"customer_phone": {"$ne": None}}):
+        s = acc.setdefault(order["customer_phone"], {
+            "order_count": 0, "visit_count": 0, "lifetime_spend": 0.0, "item_counts": {}, "recent": [],
+        })
+        s["order_count"] += 1
+        if order.get("payment_status") == "paid":
+            s["visit_count"] += 1
+            s["lifetime_spend"] += order.get("total", 0)
+        for li in order.get("items", []):
+            c = s["item_counts"].setdefault(str(li["item_id"]), {"qty": 0, "name": li.get("name")})
+            c["qty"] += li.get("qty", 1)
+        s["recent"].append(order)
+        if len(s["recent"]) > SUMMARY_APPLIED_KEEP * 2:
+            s["recent"] = _newest(s["recent"], SUMMARY_APPLIED_KEEP)
+    ops = []
+    for phone, s in acc.items():
+        recent = _newest(s.pop("recent"), SUMMARY_APPLIED_KEEP)
+        applied = []
+        for order in reversed(recent):
+            applied.append(f"created:{order['_id']}")
+            if order.get("payment_status") == "paid":
+                applied.append(f"paid:{order['_id']}")
+        ops.append(("upsert", {"_id": phone}, {
+            **s,
+            "recent_orders": [_summary_entry(o) for o in recent[:SUMMARY_RECENT_ORDERS]],
+            "applied": applied[-SUMMARY_APPLIED_KEEP:],
+        }))
+    return bulk_write("customer_summary", ops)
+
+
+def _newest(orders: List[Dict[str, Any]], n: int) -> List[Dict[str, Any]]:
+    return sorted(orders, key=lambda o: o.get("created_at") or datetime.min, reverse=True)[:n]
@@ -0,0 +1,113 @@
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+MAX_SECONDS = 60
+MIN_INTERVAL = 0.005
+# Upper bound on the share of wall time spent sampling
+MAX_DUTY_CYCLE = 0.1
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    """Periodically snapshots the stack of every thread via sys._current_frames.
+
+    Nothing is installed in the profiled threads (no settrace/setprofile), so
+    the only cost is the sampling thread itself holding the GIL for a few
+    microseconds per sample. When a sample takes longer than the interval
+    allows (many threads), the sampler backs off so it never exceeds
+    MAX_DUTY_CYCLE; the measured share is returned as overhead_pct.
+    Only one profile runs at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(self, seconds: float, interval: float = 0.01, top: int = 25) -> Dict[str, Any]:
+        # NaN slips through min/max and would never reach the deadline
+        if not (math.isfinite(seconds) and math.isfinite(interval)):
+            raise ValueError("seconds and interval must be finite")
+        seconds = min(max(seconds, 0.1), MAX_SECONDS)
+        interval = max(interval, MIN_INTERVAL)
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            return self._sample(seconds, interval, top)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float, top: int) -> Dict[str, Any]:
+        me = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        busy = 0.0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= deadline:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stacks[self._collapse(names.get(ident, str(ident)), frame)] += 1
+            samples += 1
+            t1 = time.perf_counter()
+            busy += t1 - t0
+            cost = t1 - t0
+            time.sleep(max(interval - cost, cost * (1 - MAX_DUTY_CYCLE) / MAX_DUTY_CYCLE))
+        elapsed = time.perf_counter() - started
+        return {
+            "seconds": round(elapsed, 3),
+            "interval": interval,
+            "samples": samples,
+            "overhead_pct": round(100 * busy / elapsed, 3) if elapsed else 0.0,
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()),
+            "top": self._top(stacks, top),
+        }
+
+    @staticmethod
+    def _collapse(thread_name: str, frame: Any) -> str:
+        parts: List[str] = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        parts.append(thread_name)
+        return ";".join(p.replace(";", ":") for p in reversed(parts))
+
+    @staticmethod
+    def _top(stacks: Counter, top: int) -> List[Dict[str, Any]]:
+        # self = samples where the function was the leaf; total = on the stack at all
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for fn in set(frames):
+                total[fn] += count
+        grand = sum(stacks.values()) or 1
+        ranked: List[Tuple[str, int]] = own.most_common(top)
+        return [
+            {
+                "function": fn,
+                "self": n,
+                "total": total[fn],
+                "self_pct": round(100 * n / grand, 2),
+                "total_pct": round(100 * total[fn] / grand, 2),
+            }
+            for fn, n in ranked
+        ]
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,124 @@
+"""
+Query-plan regression checks
+
+Runs `explain` on every query shape the app issues (keep QUERY_SHAPES in step
+with main.py) and fails when a plan scans the collection or examines far more
+index keys/documents than it returns. Needs the mongo storage backend and a
+populated database; seed one with seed_data.py first.
+
+    DATABASE_NAME=cafe_bench python seed_data.py && DATABASE_NAME=cafe_bench python query_plans.py
+"""
+
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from database import STORAGE_BACKEND, db, ensure_indexes
+from idempotency import idempotency
+from jobs import jobs
+
+# A plan may examine this many keys/docs per returned row (plus SLACK) before
+# it counts as unselective.
+MAX_EXAMINED_RATIO = 2.0
+SLACK = 10
+
+
+def query_shapes() -> List[Dict[str, Any]]:
+    """The find/find_one shapes from main.py, filled in with sample values."""
+    order = db["order"].find_one({"customer_phone": {"$ne": None}, "table_id": {"$ne": None}}) or {}
+    outlet_id = order.get("outlet_id", "main")
+    phone = order.get("customer_phone", "")
+    cat_ids = [c["_id"] for c in db["menucategory"].find({"outlet_id": outlet_id}, {"_id": 1})]
+    item = db["menuitem"].find_one({"outlet_id": outlet_id}) or {}
+    payment = db["payment"].find_one({"outlet_id": outlet_id}) or {}
+    customer = db["customer"].find_one({}) or {}
+    now = datetime.utcnow()
+    return [
+        {"name": "get_menu categories", "collection": "menucategory",
+         "filter": {"outlet_id": outlet_id, "disabled": {"$ne": True}}, "sort": [("order", 1)]},
+        {"name": "get_menu items", "collection": "menuitem",
+         "filter": {"outlet_id": outlet_id, "category_id": {"$in": cat_ids}, "disabled": {"$ne": True}}},
+        {"name": "menu_changes", "collection": "menuitem",
+         "filter": {"outlet_id": outlet_id, "menu_version": {"$gt": 0}}},
+        {"name": "meta by _id", "collection": "meta", "filter": {"_id": f"menu:{outlet_id}"}, "limit": 1},
+        {"name": "create_order item lookup", "collection": "menuitem",
+         "filter": {"_id": item.get("_id"), "outlet_id": outlet_id}, "limit": 1},
+        {"name": "list_orders", "collection": "order",
+         "filter": {"outlet_id": outlet_id}, "sort": [("created_at", -1)], "limit": 200},
+        {"name": "list_orders status", "collection": "order",
+         "filter": {"outlet_id": outlet_id, "status": "pending"}, "sort": [("created_at", -1)]},
+        {"name": "list_orders phone", "collection": "order",
+         "filter": {"outlet_id": outlet_id, "customer_phone": phone}, "sort": [("created_at", -1)]},
+        {"name": "table_status", "collection": "order",
+         "filter": {"outlet_id": outlet_id, "table_id": {"$ne": None}}},
+        {"name": "order by _id", "collection": "order", "filter": {"_id": order.get("_id")}, "limit": 1},
+        {"name": "payment by _id", "collection": "payment", "filter": {"_id": payment.get("_id")}, "limit": 1},
+        {"name": "list_bookings", "collection": "booking",
+         "filter": {"outlet_id": outlet_id}, "sort": [("date", 1)]},
+        {"name": "customer by phone", "collection": "customer",
+         "filter": {"phone": customer.get("phone", "")}, "limit": 1},
+        {"name": "otp by phone", "collection": "otp", "filter": {"phone": phone}, "limit": 1},
+        {"name": "customer summary", "collection": "customer_summary", "filter": {"_id": phone}, "limit": 1},
+        {"name": "job claim", "collection": "jobs",
+         "filter": {"$or": [
+             {"status": "queued", "run_at": {"$lte": now}},
+             {"status": "running", "lease_until": {"$lt": now}},
+         ]}, "sort": [("run_at", 1)], "limit": 1},
+    ]
+
+
+def _stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage", "")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _stages(child)
+    return stages
+
+
+def check(shape: Dict[str, Any]) -> Optional[str]:
+    """Returns why the shape's plan is unacceptable, or None if it is fine."""
+    cmd: Dict[str, Any] = {"find": shape["collection"], "filter": shape["filter"]}
+    if shape.get("sort"):
+        cmd["sort"] = dict(shape["sort"])
+    if shape.get("limit"):
+        cmd["limit"] = shape["limit"]
+    explain = db.command("explain", cmd, verbosity="executionStats")
+    stats = explain["executionStats"]
+    stages = _stages(explain["queryPlanner"]["winningPlan"])
+    shape["result"] = {
+        "stages": stages,
+        "returned": stats["nReturned"],
+        "keys": stats["totalKeysExamined"],
+        "docs": stats["totalDocsExamined"],
+    }
+    if "COLLSCAN" in stages and stats["totalDocsExamined"] > SLACK:
+        return "collection scan"
+    budget = stats["nReturned"] * MAX_EXAMINED_RATIO + SLACK
+    if stats["totalKeysExamined"] > budget:
+        return f"examined {stats['totalKeysExamined']} keys for {stats['nReturned']} rows"
+    if stats["totalDocsExamined"] > budget:
+        return f"examined {stats['totalDocsExamined']} docs for {stats['nReturned']} rows"
+    return None
+
+
+def main() -> int:
+    if STORAGE_BACKEND != "mongo":
+        print("query_plans.py needs STORAGE_BACKEND=mongo")
+        return 2
+    ensure_indexes()
+    idempotency.ensure_indexes()
+    jobs.ensure_indexes()
+    failures = 0
+    for shape in query_shapes():
+        problem = check(shape)
+        r = shape["result"]
+        print(f"{'FAIL' if problem else 'ok  '} {shape['name']:<28} returned={r['returned']:<6} keys={r['keys']:<7} "
+              f"docs={r['docs']:<7} {'>'.join(reversed(r['stages']))}" + (f"  <- {problem}" if problem else ""))
+        failures += bool(problem)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
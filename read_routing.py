@@ -0,0 +1,58 @@
+"""
+Read routing check
+
+Issues one read per READ_POLICY class and reports which replica-set member
+served it, failing if a "primary" read left the primary or a secondary-
+preferred read hit the primary while a secondary was available. Run it
+against a throwaway replica set on one machine:
+
+    mkdir -p /tmp/rs/{0,1,2}
+    for i in 0 1 2; do mongod --replSet rs0 --port 2701$i --dbpath /tmp/rs/$i --fork --logpath /tmp/rs/$i.log; done
+    mongosh --port 27010 --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27010"}, {_id: 1, host: "localhost:27011"}, {_id: 2, host: "localhost:27012"}]})'
+    DATABASE_URL="mongodb://localhost:27010,localhost:27011,localhost:27012/?replicaSet=rs0" python read_routing.py
+"""
+
+import sys
+import time
+from typing import Dict
+
+from database import READ_POLICY, STORAGE_BACKEND, client, read_routing_stats, reader, writer
+
+COLLECTION = "read_routing_check"
+
+
+def _served_by() -> Dict[str, int]:
+    return read_routing_stats()["served_by"]
+
+
+def main() -> int:
+    if STORAGE_BACKEND != "mongo":
+        print("read_routing.py needs STORAGE_BACKEND=mongo")
+        return 2
+    writer(COLLECTION, "critical").update_one({"_id": "probe"}, {"$set": {"at": time.time()}}, upsert=True)
+    # Wait for the driver to discover the secondaries
+    deadline = time.monotonic() + 30
+    while not client.secondaries and time.monotonic() < deadline:
+        time.sleep(0.5)
+    primary = "%s:%s" % client.primary
+    secondaries = {"%s:%s" % addr for addr in client.secondaries}
+    print(f"primary={primary} secondaries={sorted(secondaries) or '-'}")
+
+    failures = 0
+    for op, pref in READ_POLICY.items():
+        before = _served_by()
+        reader(COLLECTION, op).find_one({"_id": "probe"})
+        after = _served_by()
+        servers = [addr for addr, n in after.items() if n > before.get(addr, 0)]
+        if pref.mongos_mode == "primary":
+            ok = servers == [primary]
+        else:
+            ok = bool(servers) and (not secondaries or set(servers) <= secondaries)
+        print(f"{'ok  ' if ok else 'FAIL'} {op:<10} mode={pref.mongos_mode:<18} served_by={','.join(servers) or '-'}")
+        failures += not ok
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
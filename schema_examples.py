@@ -7,6 +7,7 @@ Copy and modify these examples for your specific needs.
 
 from datetime import datetime
 from database import create_document, get_documents, update_document, delete_document
+from ingest import events
 
 # =============================================================================
 # USER MANAGEMENT SCHEMA
@@ -252,7 +253,7 @@ def create_booking(event_id: str, user_id: str, ticket_quantity: int = 1):
 # =============================================================================
 
 def track_user_activity(user_id: str, action: str, resource_type: str, resource_id: str, metadata: dict = None):
-    """Track user activity for analytics"""
+    """Track user activity for analytics (buffered, written in batches)"""
     activity_data = {
         "user_id": user_id,
         "action": action,  # view, create, update, delete, login, etc.
@@ -264,10 +265,10 @@ def track_user_activity(user_id: str, action: str, resource_type: str, resource_
         "session_id": None,
         "timestamp": datetime.utcnow()
     }
-    return create_document("user_activities", activity_data)
+    return events.record("user_activities", activity_data)
 
 def track_page_view(page_path: str, user_id: str = None, session_id: str = None):
-    """Track page views for analytics"""
+    """Track page views for analytics (buffered, written in batches)"""
     pageview_data = {
         "page_path": page_path,
         "user_id": user_id,
@@ -284,7 +285,7 @@ def track_page_view(page_path: str, user_id: str = None, session_id: str = None)
         },
         "timestamp": datetime.utcnow()
     }
-    return create_document("page_views", pageview_data)
+    return events.record("page_views", pageview_data)
 
 # =============================================================================
 # NOTIFICATION SCHEMA
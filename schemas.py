@@ -1,9 +1,10 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional, Dict, Any
 
 # ---------- Menu ----------
 class MenuItemIn(BaseModel):
     name: str
+    slug: Optional[str] = None
     price: float
     image: Optional[str] = None
     description: Optional[str] = None
@@ -16,24 +17,56 @@ class MenuCategoryIn(BaseModel):
     order: Optional[int] = None
     items: List[MenuItemIn] = []
 
+def _not_null(value: Any) -> Any:
+    # PATCH fields may be omitted, but an explicit null would break the stored doc
+    if value is None:
+        raise ValueError("may be omitted but not null")
+    return value
+
+class MenuItemPatch(BaseModel):
+    name: Optional[str] = None
+    price: Optional[float] = None
+    image: Optional[str] = None
+    description: Optional[str] = None
+    options: Optional[Dict[str, Any]] = None
+    disabled: Optional[bool] = None
+
+    _no_nulls = field_validator("name", "price", "disabled")(_not_null)
+
+class MenuCategoryPatch(BaseModel):
+    name: Optional[str] = None
+    order: Optional[int] = None
+    disabled: Optional[bool] = None
+
+    _no_nulls = field_validator("name", "order", "disabled")(_not_null)
+
 class MenuItemOut(BaseModel):
     id: str
+    category_id: Optional[str] = None
     name: str
+    slug: Optional[str] = None
     price: float
     image: Optional[str] = None
     description: Optional[str] = None
     options: Optional[Dict[str, Any]] = None
+    disabled: bool = False
 
 class MenuCategoryOut(BaseModel):
     id: str
     name: str
     slug: Optional[str] = None
     order: int = 0
+    disabled: bool = False
     items: List[MenuItemOut] = []
 
 class MenuImportPayload(BaseModel):
     categories: List[MenuCategoryIn]
 
+class MenuChangesOut(BaseModel):
+    version: int
+    categories: List[MenuCategoryOut] = []
+    items: List[MenuItemOut] = []
+
 # ---------- Customers ----------
 class CustomerCreate(BaseModel):
     name: str
@@ -44,6 +77,14 @@ class CustomerOut(BaseModel):
     name: str
     phone: str
 
+class CustomerSummaryOut(BaseModel):
+    phone: str
+    order_count: int = 0
+    visit_count: int = 0
+    lifetime_spend: float = 0.0
+    recent_orders: List[Dict[str, Any]] = []
+    favourites: List[Dict[str, Any]] = []
+
 # ---------- Orders ----------
 class OrderCreateItem(BaseModel):
     item_id: str
@@ -52,6 +93,7 @@ class OrderCreateItem(BaseModel):
     selected_options: Optional[Dict[str, Any]] = None
 
 class OrderCreate(BaseModel):
+    outlet_id: Optional[str] = None
     customer_phone: Optional[str] = None
     table_id: Optional[str] = None
     type: str = Field(default="dine-in", description="dine-in or takeaway")
@@ -59,6 +101,7 @@ class OrderCreate(BaseModel):
 
 class OrderOut(BaseModel):
     id: str
+    outlet_id: Optional[str] = None
     customer_phone: Optional[str]
     table_id: Optional[str]
     type: str
@@ -69,6 +112,7 @@ class OrderOut(BaseModel):
 
 # ---------- Bookings ----------
 class BookingCreate(BaseModel):
+    outlet_id: Optional[str] = None
     name: str
     phone: str
     party_size: int
@@ -77,6 +121,7 @@ class BookingCreate(BaseModel):
 
 class BookingOut(BaseModel):
     id: str
+    outlet_id: Optional[str] = None
     name: str
     phone: str
     party_size: int
@@ -92,6 +137,7 @@ class PaymentCreate(BaseModel):
 
 class PaymentOut(BaseModel):
     id: str
+    outlet_id: Optional[str] = None
     order_id: str
     amount: float
     gateway: str
@@ -0,0 +1,129 @@
+"""
+Synthetic data generator
+
+Fills the configured database (DATABASE_URL / DATABASE_NAME) with a seeded,
+reproducible café workload: outlets with menus, customers, orders spread over
+the last few months, payments for paid orders, and bookings. Point it at a
+scratch database; it does not clear existing data.
+
+    DATABASE_NAME=cafe_bench python seed_data.py --orders 200000 --seed 7
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from bson import ObjectId
+from pymongo import InsertOne
+
+from database import bulk_write, ensure_indexes, writer
+
+CATEGORIES = {
+    "Espresso": ["Espresso", "Doppio", "Americano", "Cortado", "Macchiato"],
+    "Milk Coffee": ["Latte", "Flat White", "Cappuccino", "Mocha", "Spanish Latte"],
+    "Cold": ["Iced Latte", "Cold Brew", "Affogato", "Iced Americano"],
+    "Tea": ["Masala Chai", "Green Tea", "Earl Grey", "Matcha Latte"],
+    "Bakery": ["Croissant", "Banana Bread", "Almond Cake", "Cookie", "Bagel"],
+}
+ORDER_STATUSES = ["pending", "confirmed", "preparing", "ready", "completed", "cancelled"]
+ORDER_STATUS_WEIGHTS = [3, 4, 3, 2, 80, 8]
+
+
+def _insert(collection_name: str, docs: List[Dict[str, Any]]) -> int:
+    # Raw InsertOne ops keep the generated created_at instead of stamping "now"
+    return bulk_write(collection_name, (InsertOne(d) for d in docs))["inserted"]
+
+
+def generate(outlets: int = 3, customers: int = 2000, orders: int = 20000, bookings: int = 2000,
+             tables: int = 12, days: int = 90, seed: int = 42) -> Dict[str, int]:
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    outlet_ids = [f"outlet-{i + 1}" for i in range(outlets)]
+    counts: Dict[str, int] = {}
+
+    # Menus: same catalogue per outlet with local prices
+    cats: List[Dict[str, Any]] = []
+    items_by_outlet: Dict[str, List[Dict[str, Any]]] = {o: [] for o in outlet_ids}
+    for outlet_id in outlet_ids:
+        for order, (name, item_names) in enumerate(CATEGORIES.items()):
+            cat_id = ObjectId()
+            cats.append({
+                "_id": cat_id, "outlet_id": outlet_id, "name": name, "slug": name.lower().replace(" ", "-"),
+                "order": order, "disabled": False, "menu_version": 1, "created_at": now, "updated_at": now,
+            })
+            for item_name in item_names:
+                items_by_outlet[outlet_id].append({
+                    "_id": ObjectId(), "outlet_id": outlet_id, "category_id": cat_id, "name": item_name,
+                    "slug": item_name.lower().replace(" ", "-"), "price": round(rng.uniform(2.5, 7.5), 2),
+                    "image": None, "description": None, "options": {}, "disabled": rng.random() < 0.05,
+                    "menu_version": 1, "created_at": now, "updated_at": now,
+                })
+    counts["menucategory"] = _insert("menucategory", cats)
+    counts["menuitem"] = _insert("menuitem", [it for its in items_by_outlet.values() for it in its])
+    for outlet_id in outlet_ids:
+        writer("meta").update_one({"_id": f"menu:{outlet_id}"}, {"$set": {"version": 1, "published": 1}}, upsert=True)
+
+    phones = [f"9{rng.randrange(10**8, 10**9)}" for _ in range(customers)]
+    counts["customer"] = _insert("customer", [
+        {"name": f"Customer {i}", "phone": p, "created_at": now, "updated_at": now} for i, p in enumerate(phones)
+    ])
+
+    # Orders: a few regulars place most of the orders; newest ones are still open
+    order_docs: List[Dict[str, Any]] = []
+    payment_docs: List[Dict[str, Any]] = []
+    for _ in range(orders):
+        outlet_id = rng.choice(outlet_ids)
+        created = now - timedelta(seconds=rng.randrange(days * 86400))
+        dine_in = rng.random() < 0.6
+        lines = []
+        for item in rng.sample(items_by_outlet[outlet_id], rng.randint(1, 4)):
+            qty = rng.randint(1, 3)
+            lines.append({
+                "item_id": item["_id"], "name": item["name"], "qty": qty, "price": item["price"],
+                "subtotal": round(item["price"] * qty, 2), "notes": None, "selected_options": {},
+            })
+        recent = now - created < timedelta(hours=2)
+        status = rng.choice(ORDER_STATUSES[:4]) if recent else rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0]
+        paid = status not in ("pending", "cancelled")
+        doc = {
+            "_id": ObjectId(), "outlet_id": outlet_id,
+            "customer_phone": phones[int(rng.paretovariate(1.2)) % len(phones)] if rng.random() < 0.7 else None,
+            "table_id": f"T{rng.randint(1, tables)}" if dine_in else None,
+            "type": "dine-in" if dine_in else "takeaway", "status": status, "items": lines,
+            "total": round(sum(li["subtotal"] for li in lines), 2),
+            "payment_status": "paid" if paid else "unpaid", "created_at": created, "updated_at": created,
+        }
+        order_docs.append(doc)
+        if paid:
+            payment_docs.append({
+                "outlet_id": outlet_id, "order_id": doc["_id"], "amount": doc["total"], "gateway": "demo",
+                "status": "success", "created_at": created, "updated_at": created,
+            })
+    counts["order"] = _insert("order", order_docs)
+    counts["payment"] = _insert("payment", payment_docs)
+
+    booking_docs = []
+    for _ in range(bookings):
+        day = now + timedelta(days=rng.randint(-days, 30))
+        booking_docs.append({
+            "outlet_id": rng.choice(outlet_ids), "name": f"Guest {rng.randrange(10**4)}", "phone": rng.choice(phones),
+            "party_size": rng.randint(1, 8), "date": day.strftime("%Y-%m-%d"),
+            "time": f"{rng.randint(8, 21):02d}:{rng.choice(['00', '30'])}",
+            "status": "cancelled" if rng.random() < 0.1 else "confirmed", "created_at": now, "updated_at": now,
+        })
+    counts["booking"] = _insert("booking", booking_docs)
+    ensure_indexes()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--outlets", type=int, default=3)
+    parser.add_argument("--customers", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(generate(args.outlets, args.customers, args.orders, args.bookings, days=args.days, seed=args.seed))
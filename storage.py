@@ -0,0 +1,552 @@
+"""Storage backends for the data layer.
+
+``Storage``/``StorageCollection`` describe the subset of the pymongo
+Database/Collection API the app relies on; a real pymongo database satisfies
+them as-is. ``MemoryDatabase`` is an embedded implementation of the same
+subset for single-outlet kiosks, tests and benchmarks: documents live in
+process memory, equality/``$in`` lookups on indexed fields use hash indexes,
+and the whole store can be snapshotted to a BSON file and reloaded on start.
+"""
+import copy
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Protocol, Set, Tuple
+
+import bson
+from bson import ObjectId
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+
+class StorageCollection(Protocol):
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, session: Any = None) -> Any: ...
+    def find_one(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, session: Any = None) -> Optional[Dict[str, Any]]: ...
+    def find_one_and_update(self, filter: Dict[str, Any], update: Dict[str, Any], **kwargs: Any) -> Optional[Dict[str, Any]]: ...
+    def insert_one(self, document: Dict[str, Any]) -> InsertOneResult: ...
+    def insert_many(self, documents: Iterable[Dict[str, Any]], ordered: bool = True) -> InsertManyResult: ...
+    def update_one(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> UpdateResult: ...
+    def update_many(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> UpdateResult: ...
+    def delete_one(self, filter: Dict[str, Any]) -> DeleteResult: ...
+    def delete_many(self, filter: Dict[str, Any]) -> DeleteResult: ...
+    def bulk_write(self, requests: List[Any], ordered: bool = True) -> BulkWriteResult: ...
+    def count_documents(self, filter: Dict[str, Any]) -> int: ...
+    def create_index(self, keys: Any, **kwargs: Any) -> str: ...
+
+
+class Storage(Protocol):
+    def __getitem__(self, name: str) -> StorageCollection: ...
+    def get_collection(self, name: str, **kwargs: Any) -> StorageCollection: ...
+    def list_collection_names(self) -> List[str]: ...
+
+
+# ---------- query matching ----------
+
+def _resolve(doc: Any, path: str) -> List[Any]:
+    """All values at a dotted path, descending into arrays like Mongo does."""
+    values = [doc]
+    for part in path.split("."):
+        nxt: List[Any] = []
+        for v in values:
+            if isinstance(v, dict):
+                if part in v:
+                    nxt.append(v[part])
+            elif isinstance(v, list):
+                if part.isdigit() and int(part) < len(v):
+                    nxt.append(v[int(part)])
+                else:
+                    nxt.extend(e[part] for e in v if isinstance(e, dict) and part in e)
+        values = nxt
+    return values
+
+
+def _expand(values: List[Any]) -> List[Any]:
+    out: List[Any] = []
+    for v in values:
+        out.append(v)
+        if isinstance(v, list):
+            out.extend(v)
+    return out
+
+
+def _same(a: Any, b: Any) -> bool:
+    # BSON booleans are their own type: true never equals 1
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    return a == b
+
+
+def _equals(values: List[Any], target: Any) -> bool:
+    if not values:
+        return target is None
+    return any(_same(v, target) for v in _expand(values))
+
+
+def _compare(values: List[Any], target: Any, op: str) -> bool:
+    for v in _expand(values):
+        try:
+            if (op == "$gt" and v > target) or (op == "$gte" and v >= target) \
+                    or (op == "$lt" and v < target) or (op == "$lte" and v <= target):
+                return True
+        except TypeError:
+            continue
+    return False
+
+
+def _match_cond(values: List[Any], cond: Any) -> bool:
+    if not (isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond)):
+        return _equals(values, cond)
+    for op, arg in cond.items():
+        if op == "$eq":
+            ok = _equals(values, arg)
+        elif op == "$ne":
+            ok = not _equals(values, arg)
+        elif op == "$in":
+            ok = any(_equals(values, a) for a in arg)
+        elif op == "$nin":
+            ok = not any(_equals(values, a) for a in arg)
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            ok = _compare(values, arg, op)
+        elif op == "$exists":
+            ok = bool(values) == bool(arg)
+        else:
+            raise ValueError(f"Unsupported query operator: {op}")
+        if not ok:
+            return False
+    return True
+
+
+def matches(doc: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    for key, cond in (filter or {}).items():
+        if key == "$or":
+            if not any(matches(doc, f) for f in cond):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, f) for f in cond):
+                return False
+        elif not _match_cond(_resolve(doc, key), cond):
+            return False
+    return True
+
+
+# ---------- updates ----------
+def _positional(path: str, doc: Dict[str, Any], filter: Dict[str, Any]) -> str:
+    # "arr.$.field": replace $ with the index of the first element the filter matched
+    if ".$" not in path:
+        return path
+    prefix, rest = path.split(".$", 1)
+    array = _resolve(doc, prefix)
+    array = array[0] if array and isinstance(array[0], list) else []
+    conds = {k[len(prefix) + 1:]: v for k, v in filter.items() if k.startswith(prefix + ".")}
+    for i, element in enumerate(array):
+        if all(_match_cond(_resolve(element, k), v) for k, v in conds.items()):
+            return f"{prefix}.{i}{rest}"
+    raise ValueError(f"The positional operator did not find the match needed from the query: {path}")
+
+
+def _parent(doc: Dict[str, Any], path: str, create: bool = True) -> Tuple[Any, str]:
+    parts = path.split(".")
+    cur: Any = doc
+    for part in parts[:-1]:
+        if isinstance(cur, list):
+            cur = cur[int(part)]
+            continue
+        if part not in cur or cur[part] is None:
+            if not create:
+                return None, parts[-1]
+            cur[part] = {}
+        cur = cur[part]
+    return cur, parts[-1]
+
+
+def _set(doc: Dict[str, Any], path: str, value: Any) -> None:
+    parent, key = _parent(doc, path)
+    if isinstance(parent, list):
+        parent[int(key)] = value
+    else:
+        parent[key] = value
+
+
+def _get(doc: Dict[str, Any], path: str, default: Any = None) -> Any:
+    parent, key = _parent(doc, path, create=False)
+    if parent is None:
+        return default
+    if isinstance(parent, list):
+        return parent[int(key)] if int(key) < len(parent) else default
+    return parent.get(key, default)
+
+
+def apply_update(doc: Dict[str, Any], update: Dict[str, Any], filter: Dict[str, Any], inserting: bool = False) -> None:
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            path = _positional(path, doc, filter)
+            if op in ("$set", "$setOnInsert"):
+                _set(doc, path, copy.deepcopy(value))
+            elif op == "$unset":
+                parent, key = _parent(doc, path, create=False)
+                if isinstance(parent, dict):
+                    parent.pop(key, None)
+            elif op == "$inc":
+                _set(doc, path, _get(doc, path, 0) + value)
+            elif op == "$push":
+                arr = list(_get(doc, path, None) or [])
+                if isinstance(value, dict) and "$each" in value:
+                    each = copy.deepcopy(value["$each"])
+                    pos = value.get("$position", len(arr))
+                    arr[pos:pos] = each
+                    if "$slice" in value:
+                        n = value["$slice"]
+                        arr = arr[:n] if n >= 0 else arr[n:]
+                else:
+                    arr.append(copy.deepcopy(value))
+                _set(doc, path, arr)
+            elif op == "$addToSet":
+                arr = list(_get(doc, path, None) or [])
+                if not any(_same(v, value) for v in arr):
+                    arr.append(copy.deepcopy(value))
+                _set(doc, path, arr)
+            else:
+                raise ValueError(f"Unsupported update operator: {op}")
+
+
+# ---------- sorting / projection ----------
+_TYPE_ORDER = {type(None): 0, int: 1, float: 1, bool: 1, str: 2, dict: 3, list: 4, ObjectId: 5, datetime: 6}
+
+
+def _sort_value(doc: Dict[str, Any], path: str) -> Tuple[int, Any]:
+    values = _resolve(doc, path)
+    v = values[0] if values else None
+    rank = _TYPE_ORDER.get(type(v), 9)
+    return rank, (v if rank in (1, 2, 5, 6) else 0)
+
+
+def _sort_docs(docs: List[Dict[str, Any]], spec: List[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    for path, direction in reversed(spec):
+        docs.sort(key=lambda d: _sort_value(d, path), reverse=direction < 0)
+    return docs
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return doc
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    # {"_id": 1} on its own is an inclusion projection too
+    if include or all(projection.values()):
+        out = {k: doc[k] for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    return {k: v for k, v in doc.items() if projection.get(k, 1)}
+
+
+def _index_key(value: Any) -> Any:
+    # Keep True/False apart from 1/0 in the hash indexes
+    return ("$bool", value) if isinstance(value, bool) else value
+
+
+class MemoryCursor:
+    def __init__(self, collection: "MemoryCollection", filter: Optional[Dict[str, Any]], projection: Optional[Dict[str, Any]]):
+        self._collection = collection
+        self._filter = filter or {}
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list: Any, direction: int = 1) -> "MemoryCursor":
+        self._sort = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def skip(self, n: int) -> "MemoryCursor":
+        self._skip = n
+        return self
+
+    def limit(self, n: int) -> "MemoryCursor":
+        self._limit = n
+        return self
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        docs = self._collection._select(self._filter)
+        if self._sort:
+            docs = _sort_docs(docs, self._sort)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return iter([_project(copy.deepcopy(d), self._projection) for d in docs])
+
+
+class MemoryCollection:
+    """A single collection: documents by _id plus hash indexes on leading fields."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._docs: Dict[Any, Dict[str, Any]] = {}
+        self._indexes: Dict[str, Dict[Any, Set[Any]]] = {}
+        self._ttl: Optional[Tuple[str, int]] = None
+        self._next_purge = 0.0
+        self._lock = threading.RLock()
+
+    # -- indexes --
+    def create_index(self, keys: Any, **kwargs: Any) -> str:
+        field = keys if isinstance(keys, str) else keys[0][0]
+        with self._lock:
+            if "expireAfterSeconds" in kwargs:
+                self._ttl = (field, kwargs["expireAfterSeconds"])
+            if field != "_id" and field not in self._indexes:
+                self._indexes[field] = {}
+                for _id, doc in self._docs.items():
+                    self._index_add(field, _id, doc)
+        return field
+
+    @staticmethod
+    def _ikeys(doc: Dict[str, Any], field: str) -> Set[Any]:
+        values = _expand(_resolve(doc, field)) or [None]
+        return {_index_key(v) if isinstance(v, (str, int, float, bool, ObjectId, datetime, type(None))) else repr(v) for v in values}
+
+    def _index_add(self, field: str, _id: Any, doc: Dict[str, Any]) -> None:
+        for k in self._ikeys(doc, field):
+            self._indexes[field].setdefault(k, set()).add(_id)
+
+    def _index_remove(self, field: str, _id: Any, doc: Dict[str, Any]) -> None:
+        for k in self._ikeys(doc, field):
+            ids = self._indexes[field].get(k)
+            if ids:
+                ids.discard(_id)
+                if not ids:
+                    del self._indexes[field][k]
+
+    def _store(self, doc: Dict[str, Any], old: Optional[Dict[str, Any]] = None) -> None:
+        _id = doc["_id"]
+        for field in self._indexes:
+            if old is not None:
+                self._index_remove(field, _id, old)
+            self._index_add(field, _id, doc)
+        self._docs[_id] = doc
+
+    def _drop(self, _id: Any) -> None:
+        doc = self._docs.pop(_id)
+        for field in self._indexes:
+            self._index_remove(field, _id, doc)
+
+    def _candidates(self, filter: Dict[str, Any]) -> Iterable[Any]:
+        # Narrow by _id or an indexed field compared by equality/$in, else scan
+        for field in ["_id", *self._indexes]:
+            if field not in filter:
+                continue
+            cond = filter[field]
+            if isinstance(cond, dict) and any(k.startswith("$") for k in cond):
+                if set(cond) != {"$in"}:
+                    continue
+                wanted = cond["$in"]
+            else:
+                wanted = [cond]
+            if field == "_id":
+                return [w for w in wanted if w in self._docs]
+            ids: Set[Any] = set()
+            try:
+                for w in wanted:
+                    ids |= self._indexes[field].get(_index_key(w), set())
+            except TypeError:  # unhashable value (e.g. a sub-document); scan instead
+                continue
+            return ids
+        return list(self._docs)
+
+    def _select(self, filter: Dict[str, Any]) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._purge_expired()
+            return [d for d in (self._docs.get(i) for i in self._candidates(filter)) if d is not None and matches(d, filter)]
+
+    def _purge_expired(self) -> None:
+        if self._ttl is None or time.monotonic() < self._next_purge:
+            return
+        field, seconds = self._ttl
+        cutoff = datetime.utcnow() - timedelta(seconds=seconds)
+        for _id in [i for i, d in self._docs.items() if isinstance(d.get(field), datetime) and d[field] < cutoff]:
+            self._drop(_id)
+        self._next_purge = time.monotonic() + 60
+
+    # -- reads --
+    # session is accepted for pymongo compatibility; a single process is
+    # always causally consistent
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, session: Any = None) -> MemoryCursor:
+        return MemoryCursor(self, filter, projection)
+
+    def find_one(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, session: Any = None) -> Optional[Dict[str, Any]]:
+        for doc in self.find(filter, projection).limit(1):
+            return doc
+        return None
+
+    def count_documents(self, filter: Dict[str, Any]) -> int:
+        return len(self._select(filter))
+
+    # -- writes --
+    def insert_one(self, document: Dict[str, Any]) -> InsertOneResult:
+        with self._lock:
+            document.setdefault("_id", ObjectId())
+            if document["_id"] in self._docs:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} dup key: {{ _id: {document['_id']!r} }}")
+            self._store(copy.deepcopy(document))
+        return InsertOneResult(document["_id"], True)
+
+    def insert_many(self, documents: Iterable[Dict[str, Any]], ordered: bool = True) -> InsertManyResult:
+        ids = [self.insert_one(d).inserted_id for d in documents]
+        return InsertManyResult(ids, True)
+
+    def _update(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool, many: bool) -> Tuple[int, int, Any]:
+        with self._lock:
+            targets = self._select(filter)
+            if not many:
+                targets = targets[:1]
+            modified = 0
+            for old in targets:
+                new = copy.deepcopy(old)
+                apply_update(new, update, filter)
+                new["_id"] = old["_id"]
+                if new != old:
+                    self._store(new, old)
+                    modified += 1
+            if targets or not upsert:
+                return len(targets), modified, None
+            new = {k: copy.deepcopy(v) for k, v in filter.items()
+                   if not k.startswith("$") and not (isinstance(v, dict) and any(x.startswith("$") for x in v))}
+            apply_update(new, update, filter, inserting=True)
+            new.setdefault("_id", ObjectId())
+            if new["_id"] in self._docs:
+                # the filter didn't match the existing document with this _id
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} dup key: {{ _id: {new['_id']!r} }}")
+            self._store(new)
+            return 0, 0, new["_id"]
+
+    def update_one(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> UpdateResult:
+        n, modified, upserted = self._update(filter, update, upsert, many=False)
+        return UpdateResult(_raw_update(n, modified, upserted), True)
+
+    def update_many(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> UpdateResult:
+        n, modified, upserted = self._update(filter, update, upsert, many=True)
+        return UpdateResult(_raw_update(n, modified, upserted), True)
+
+    def find_one_and_update(self, filter: Dict[str, Any], update: Dict[str, Any], projection: Optional[Dict[str, Any]] = None,
+                            sort: Optional[List[Tuple[str, int]]] = None, upsert: bool = False,
+                            return_document: bool = False) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            docs = self._select(filter)
+            if sort:
+                docs = _sort_docs(docs, sort)
+            if docs:
+                before = docs[0]
+                self._update({"_id": before["_id"], **filter}, update, upsert=False, many=False)
+                result = self._docs[before["_id"]] if return_document else before
+            elif upsert:
+                _, _, upserted = self._update(filter, update, upsert=True, many=False)
+                result = self._docs[upserted] if return_document else None
+            else:
+                result = None
+            return _project(copy.deepcopy(result), projection) if result is not None else None
+
+    def delete_one(self, filter: Dict[str, Any]) -> DeleteResult:
+        with self._lock:
+            docs = self._select(filter)[:1]
+            for d in docs:
+                self._drop(d["_id"])
+        return DeleteResult({"n": len(docs)}, True)
+
+    def delete_many(self, filter: Dict[str, Any]) -> DeleteResult:
+        with self._lock:
+            docs = self._select(filter)
+            for d in docs:
+                self._drop(d["_id"])
+        return DeleteResult({"n": len(docs)}, True)
+
+    def bulk_write(self, requests: List[Any], ordered: bool = True) -> BulkWriteResult:
+        inserted = matched = modified = removed = 0
+        upserted: List[Dict[str, Any]] = []
+        for i, req in enumerate(requests):
+            if isinstance(req, InsertOne):
+                self.insert_one(req._doc)
+                inserted += 1
+            elif isinstance(req, UpdateOne):
+                n, m, up = self._update(req._filter, req._doc, bool(req._upsert), many=False)
+                matched += n
+                modified += m
+                if up is not None:
+                    upserted.append({"index": i, "_id": up})
+            elif isinstance(req, DeleteOne):
+                removed += self.delete_one(req._filter).deleted_count
+            else:
+                raise ValueError(f"Unsupported bulk operation: {type(req).__name__}")
+        return BulkWriteResult({
+            "nInserted": inserted, "nMatched": matched, "nModified": modified,
+            "nRemoved": removed, "nUpserted": len(upserted), "upserted": upserted,
+            "writeErrors": [], "writeConcernErrors": [],
+        }, True)
+
+
+def _raw_update(n: int, modified: int, upserted: Any) -> Dict[str, Any]:
+    raw: Dict[str, Any] = {"n": n + (1 if upserted is not None else 0), "nModified": modified, "updatedExisting": n > 0}
+    if upserted is not None:
+        raw["upserted"] = upserted
+    return raw
+
+
+class MemoryDatabase:
+    """In-process database with optional BSON snapshots at ``snapshot_path``."""
+
+    def __init__(self, snapshot_path: Optional[str] = None):
+        self.snapshot_path = snapshot_path
+        self._collections: Dict[str, MemoryCollection] = {}
+        self._lock = threading.Lock()
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        if snapshot_path and os.path.exists(snapshot_path):
+            self._load(snapshot_path)
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = MemoryCollection(name)
+            return self._collections[name]
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name: str, **kwargs: Any) -> MemoryCollection:
+        # read_preference / write_concern have no meaning in-process
+        return self[name]
+
+    def list_collection_names(self) -> List[str]:
+        return [name for name, c in self._collections.items() if c._docs]
+
+    def snapshot(self) -> None:
+        """Write every collection to ``snapshot_path`` atomically."""
+        if not self.snapshot_path:
+            return
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, "wb") as f:
+            for name, col in list(self._collections.items()):
+                with col._lock:
+                    docs = list(col._docs.values())
+                for doc in docs:
+                    f.write(bson.encode({"c": name, "d": doc}))
+        os.replace(tmp, self.snapshot_path)
+
+    def start_snapshots(self, interval: float) -> None:
+        def run() -> None:
+            while not self._stopping.wait(interval):
+                self.snapshot()
+        self._snapshot_thread = threading.Thread(target=run, name="memory-snapshot", daemon=True)
+        self._snapshot_thread.start()
+
+    def close(self) -> None:
+        self._stopping.set()
+        self.snapshot()
+
+    def _load(self, path: str) -> None:
+        with open(path, "rb") as f:
+            for rec in bson.decode_file_iter(f):
+                self[rec["c"]]._store(rec["d"])
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Optional
+
+from anyio.to_thread import current_default_thread_limiter
+
+logger = logging.getLogger(__name__)
+
+WORKER_THREAD_NAME = "AnyIO worker thread"
+WINDOW = 600
+
+
+class LoopWatchdog:
+    """Watches the event loop and the threadpool that runs sync handlers.
+
+    A heartbeat task on the loop sleeps ``interval`` and records how late it
+    woke up (scheduling lag) along with the default anyio thread limiter's
+    borrowed/waiting counts. A separate monitor thread notices when the
+    heartbeat stops arriving and logs the loop thread's current stack, which
+    is the coroutine or handler that is blocking it; when the threadpool is
+    saturated it logs what the busy workers are doing instead.
+    """
+
+    def __init__(self, interval: float = 0.1, lag_threshold: float = 0.25,
+                 saturation_threshold: float = 0.9, log_cooldown: float = 30.0):
+        self.interval = interval
+        self.lag_threshold = lag_threshold
+        self.saturation_threshold = saturation_threshold
+        self.log_cooldown = log_cooldown
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._monitor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._beat = 0.0
+        self._stall_reported = False
+        self._last_pool_log = 0.0
+        self._lags: Deque[float] = deque(maxlen=WINDOW)
+        self._max_lag = 0.0
+        self._slow_ticks = 0
+        self._stalls = 0
+        self._pool = {"total": 0, "borrowed": 0, "waiting": 0}
+        self._max_waiting = 0
+        self._max_borrowed = 0
+        self._saturations = 0
+
+    def start(self) -> None:
+        """Start watching the running loop; call from a startup hook."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._stop.clear()
+        self._task = self._loop.create_task(self._heartbeat())
+        self._monitor = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._monitor.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+            self._task = None
+        if self._monitor is not None:
+            self._monitor.join(1.0)
+            self._monitor = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lags = sorted(self._lags)
+            last_lag = self._lags[-1] if self._lags else 0.0
+            pool = dict(self._pool)
+            counts = {
+                "slow_ticks": self._slow_ticks,
+                "stalls": self._stalls,
+                "max_waiting": self._max_waiting,
+                "max_borrowed": self._max_borrowed,
+                "saturations": self._saturations,
+            }
+            max_lag = self._max_lag
+        blocked = time.perf_counter() - self._beat if self._task is not None else 0.0
+        return {
+            "loop": {
+                "lag_ms": round(last_lag * 1000, 2),
+                "p50_lag_ms": round(lags[len(lags) // 2] * 1000, 2) if lags else 0.0,
+                "p99_lag_ms": round(lags[int(len(lags) * 0.99)] * 1000, 2) if lags else 0.0,
+                "max_lag_ms": round(max_lag * 1000, 2),
+                # > interval means the loop is blocked right now
+                "since_heartbeat_ms": round(blocked * 1000, 2),
+                "slow_ticks": counts["slow_ticks"],
+                "stalls": counts["stalls"],
+            },
+            "threadpool": {
+                **pool,
+                "utilization": round(pool["borrowed"] / pool["total"], 3) if pool["total"] else 0.0,
+                "max_waiting": counts["max_waiting"],
+                "max_borrowed": counts["max_borrowed"],
+                "saturations": counts["saturations"],
+            },
+        }
+
+    async def _heartbeat(self) -> None:
+        limiter = current_default_thread_limiter()
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            limits = limiter.statistics()
+            with self._lock:
+                self._beat = now
+                self._stall_reported = False
+                self._lags.append(lag)
+                self._max_lag = max(self._max_lag, lag)
+                if lag >= self.lag_threshold:
+                    self._slow_ticks += 1
+                self._pool = {
+                    "total": int(limits.total_tokens),
+                    "borrowed": limits.borrowed_tokens,
+                    "waiting": limits.tasks_waiting,
+                }
+                self._max_waiting = max(self._max_waiting, limits.tasks_waiting)
+                self._max_borrowed = max(self._max_borrowed, limits.borrowed_tokens)
+
+    def _watch(self) -> None:
+        poll = min(self.interval, self.lag_threshold / 2)
+        while not self._stop.wait(poll):
+            try:
+                self._check_loop()
+                self._check_pool()
+            except Exception:
+                logger.exception("Watchdog check failed")
+
+    def _check_loop(self) -> None:
+        with self._lock:
+            blocked = time.perf_counter() - self._beat - self.interval
+            if blocked < self.lag_threshold or self._stall_reported:
+                return
+            self._stall_reported = True
+            self._stalls += 1
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "<no frame>"
+        logger.warning("Event loop blocked for %.0f ms; loop thread stack:\n%s", blocked * 1000, stack)
+
+    def _check_pool(self) -> None:
+        with self._lock:
+            pool = dict(self._pool)
+        saturated = pool["waiting"] > 0 or (
+            pool["total"] and pool["borrowed"] / pool["total"] >= self.saturation_threshold)
+        now = time.monotonic()
+        if not saturated or now - self._last_pool_log < self.log_cooldown:
+            return
+        self._last_pool_log = now
+        with self._lock:
+            self._saturations += 1
+        stacks = self._busy_worker_stacks()
+        logger.warning(
+            "Threadpool saturated: %d/%d workers busy, %d waiting; most common worker stacks:\n%s",
+            pool["borrowed"], pool["total"], pool["waiting"],
+            "\n".join(f"[{n} workers]\n{stack}" for stack, n in stacks.most_common(3)),
+        )
+
+    @staticmethod
+    def _busy_worker_stacks() -> Counter:
+        workers = {t.ident for t in threading.enumerate() if t.name == WORKER_THREAD_NAME}
+        stacks: Counter = Counter()
+        for ident, frame in sys._current_frames().items():
+            if ident not in workers or _is_idle(frame):
+                continue
+            stacks["".join(traceback.format_stack(frame))] += 1
+        return stacks
+
+
+def _is_idle(frame: Any) -> bool:
+    # idle workers sit in queue.get() directly under WorkerThread.run
+    inner = None
+    while frame is not None:
+        if frame.f_code.co_name == "run" and "anyio" in frame.f_code.co_filename:
+            return inner is not None and inner.f_code.co_name == "get"
+        inner, frame = frame, frame.f_back
+    return False
+
+
+watchdog = LoopWatchdog(
+    interval=float(os.getenv("WATCHDOG_INTERVAL_SECONDS", "0.1")),
+    lag_threshold=float(os.getenv("WATCHDOG_LAG_MS", "250")) / 1000,
+    saturation_threshold=float(os.getenv("WATCHDOG_SATURATION", "0.9")),
+)